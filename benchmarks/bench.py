@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Microbenchmarks of flask_obfuscateids.
+
+Run from the root of the repo::
+
+	python benchmarks/bench.py --output before.json
+	python benchmarks/bench.py --output after.json --compare before.json
+
+Each benchmark is timed with timeit, taking the best of --repeat runs, and
+reported in microseconds per call. flask_obfuscateids has to be importable,
+e.g. with ``pip install --editable .``. The results are written as JSON so that
+two versions can be compared with --compare.
+'''
+from __future__ import print_function
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import timeit
+
+from flask import Flask
+
+import flask_obfuscateids
+from flask_obfuscateids import ObfuscateIDs, ModelMixin
+from flask_obfuscateids.extension import _current_obfuscator
+from flask_obfuscateids.lib import obfuscate, deobfuscate, Obfuscator, ALPHANUM, BASE58
+
+KEY = 'benchmark key'
+ALPHABETS = (('ALPHANUM', ALPHANUM), ('BASE58', BASE58))
+MAGNITUDES = (1, 10 ** 3, 10 ** 6, 10 ** 9, 2 ** 63 - 1)
+NUM_CHECK_CHARS = (0, 1, 2)
+NUM_INSTANCES = 1000
+
+
+class BenchModel(ModelMixin):
+
+	def __init__(self, ident):
+		self.id = ident
+
+
+def time_per_call(func, repeat, number=None):
+	'''Return the best time of repeat runs of func in seconds per call.'''
+	timer = timeit.Timer(func)
+	if number is None:
+		number, _ = timer.autorange()
+	return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def bench_lib():
+	'''Yield the names and functions of lib and Obfuscator obfuscate and deobfuscate.'''
+	for alphabet_name, alphabet in ALPHABETS:
+		for num_check_chars in NUM_CHECK_CHARS:
+			o = Obfuscator(KEY, alphabet=alphabet, num_check_chars=num_check_chars)
+			for num in MAGNITUDES:
+				s = obfuscate(num, KEY, alphabet, num_check_chars=num_check_chars)
+				o_s = o.obfuscate(num)
+				params = 'alphabet=%s num_check_chars=%d num=%d' % (alphabet_name, num_check_chars, num)
+				yield 'lib.obfuscate ' + params, lambda: obfuscate(
+					num, KEY, alphabet, num_check_chars=num_check_chars)
+				yield 'lib.deobfuscate ' + params, lambda: deobfuscate(
+					s, KEY, alphabet, num_check_chars=num_check_chars)
+				yield 'Obfuscator.obfuscate ' + params, lambda: o.obfuscate(num)
+				yield 'Obfuscator.deobfuscate ' + params, lambda: o.deobfuscate(o_s)
+
+
+def bench_construction():
+	'''Yield the names and functions of building and first using an Obfuscator.'''
+	for alphabet_name, alphabet in ALPHABETS:
+		yield 'Obfuscator() alphabet=%s' % alphabet_name, lambda: Obfuscator(
+			KEY, alphabet=alphabet)
+		yield 'Obfuscator().obfuscate() alphabet=%s' % alphabet_name, lambda: Obfuscator(
+			KEY, alphabet=alphabet).obfuscate(1)
+
+
+def bench_import():
+	'''Yield the names and functions of importing the package in a new interpreter.
+
+	Starting the interpreter alone is timed too, to tell it apart.
+	'''
+	for name, code in (
+			('import nothing, interpreter startup only', 'pass'),
+			('import flask_obfuscateids.lib', 'import flask_obfuscateids.lib'),
+			('import flask_obfuscateids.extension', 'import flask_obfuscateids.extension'),
+			):
+		yield name, lambda: subprocess.check_call([sys.executable, '-c', code])
+
+
+def make_app():
+	app = Flask(__name__)
+	app.config['SECRET_KEY'] = KEY
+	ObfuscateIDs(app)
+
+	@app.route('/empty')
+	def empty():
+		return ''
+
+	@app.route('/obfuscator')
+	def obfuscator():
+		_current_obfuscator()
+		return ''
+
+	@app.route('/public_id')
+	def public_id():
+		return BenchModel(1).public_id
+
+	return app
+
+
+def bench_flask():
+	'''Yield the names and functions of getting the obfuscator and public ids.'''
+	app = make_app()
+	client = app.test_client()
+	for path in ('/empty', '/obfuscator', '/public_id'):
+		yield 'request ' + path, lambda: client.get(path)
+	with app.test_request_context():
+		yield '_current_obfuscator()', _current_obfuscator
+		instances = [BenchModel(ident) for ident in range(NUM_INSTANCES)]
+
+		def public_ids():
+			for instance in instances:
+				instance.public_id
+
+		def public_ids_uncached():
+			for instance in instances:
+				instance.__dict__.pop('_obfuscate_ids_public_id', None)
+				instance.public_id
+
+		yield 'public_id x%d' % NUM_INSTANCES, public_ids
+		yield 'public_id uncached x%d' % NUM_INSTANCES, public_ids_uncached
+
+
+BENCHMARKS = (bench_lib, bench_construction, bench_import, bench_flask)
+
+
+def run(repeat, pattern=None):
+	results = {}
+	for benchmark in BENCHMARKS:
+		for name, func in benchmark():
+			if pattern is None or pattern in name:
+				results[name] = time_per_call(func, repeat) * 1e6
+				print('%-80s %10.3f us' % (name, results[name]))
+	return results
+
+
+def compare(results, other_results):
+	'''Print the ratio of each result to the one in other_results.'''
+	print()
+	print('%-80s %10s' % ('Compared to previous run', 'ratio'))
+	for name, value in results.items():
+		if name in other_results:
+			print('%-80s %10.2f' % (name, value / other_results[name]))
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--output', help='Write the results as JSON to this file')
+	parser.add_argument('--compare', help='A JSON file of previous results to compare to')
+	parser.add_argument('--repeat', type=int, default=5, help='Number of runs to take the best of')
+	parser.add_argument('-k', dest='pattern', help='Only run benchmarks whose names contain this')
+	args = parser.parse_args(argv)
+	results = run(args.repeat, args.pattern)
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump({
+				'version': flask_obfuscateids.__version__,
+				'python': platform.python_implementation() + ' ' + platform.python_version(),
+				'speedups': Obfuscator(KEY)._speedups is not None,
+				'unit': 'us',
+				'results': results,
+				}, f, indent=2, sort_keys=True)
+	if args.compare:
+		with open(args.compare) as f:
+			compare(results, json.load(f)['results'])
+
+
+if __name__ == '__main__':
+	sys.exit(main())
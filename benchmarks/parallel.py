@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Scaling of the parallel option of obfuscate_many and deobfuscate_many.
+
+Run from the root of the repo::
+
+	python benchmarks/parallel.py --output parallel.json
+
+Times obfuscating and deobfuscating --count ids serially and with 1 up to
+--max-workers worker processes, and prints the throughput and the speedup
+over the serial path. The pool is started by each call, so its startup is
+included. The results are written as JSON with --output.
+'''
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from flask_obfuscateids.lib import Obfuscator, STREAM_CHUNK_SIZE
+
+KEY = 'benchmark key'
+
+
+def best_time(func, repeat):
+	'''Return the best time in seconds of repeat calls of func.'''
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		func()
+		times.append(time.perf_counter() - start)
+	return min(times)
+
+
+def run(count, max_workers, chunk_size, repeat):
+	o = Obfuscator(KEY, min_length=8)
+	nums = list(range(10 ** 9, 10 ** 9 + count))
+	strings = o.obfuscate_many(nums)
+	results = []
+	print('%-10s %-12s %14s %10s' % ('workers', 'operation', 'ids/s', 'speedup'))
+	for workers in [None] + list(range(1, max_workers + 1)):
+		for operation, func in (
+				('obfuscate', lambda: list(o.obfuscate_stream(nums, chunk_size=chunk_size, parallel=workers))),
+				('deobfuscate', lambda: list(o.deobfuscate_stream(strings, chunk_size=chunk_size, parallel=workers))),
+				):
+			seconds = best_time(func, repeat)
+			result = {
+				'workers': workers or 0,
+				'operation': operation,
+				'seconds': seconds,
+				'ids_per_second': count / seconds,
+				}
+			results.append(result)
+			serial_seconds = next(
+				r['seconds'] for r in results if r['workers'] == 0 and r['operation'] == operation)
+			result['speedup'] = serial_seconds / seconds
+			print('%-10s %-12s %14.0f %10.2f' % (
+				workers or 'serial', operation, result['ids_per_second'], result['speedup']))
+	return results
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--count', type=int, default=2000000, help='The number of ids')
+	parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+	parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE)
+	parser.add_argument('--repeat', type=int, default=3, help='Number of runs to take the best of')
+	parser.add_argument('--output', help='Write the results as JSON to this file')
+	args = parser.parse_args(argv)
+	results = run(args.count, args.max_workers, args.chunk_size, args.repeat)
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump({
+				'python': platform.python_implementation() + ' ' + platform.python_version(),
+				'cpu_count': os.cpu_count(),
+				'count': args.count,
+				'chunk_size': args.chunk_size,
+				'results': results,
+				}, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -58,110 +58,30 @@ http://stackoverflow.com/questions/1895685/should-i-obscure-primary-key-values
 '''
 from __future__ import absolute_import, unicode_literals
 
-from flask import current_app, abort
-
-# Find the stack on which we want to store the database connection.
-# Starting with Flask 0.9, the _app_ctx_stack is the correct one,
-# before that we need to use the _request_ctx_stack.
-try:
-	from flask import _app_ctx_stack as stack
-except ImportError:
-	from flask import _request_ctx_stack as stack
-
-from . import lib
+from . import lib  # noqa: F401
 
 __version__ = '0.0.1'
 
-
-class ObfuscateIDs():
-
-	def __init__(self, app=None):
-		self.app = app
-		if app is not None:
-			self.init_app(app)
-
-	def init_app(self, app):
-		app.config.setdefault('OBFUSCATE_IDS_KEY', app.config['SECRET_KEY'])
-		app.config.setdefault('OBFUSCATE_IDS_MIN_LENGTH', 8)
-		app.config.setdefault('OBFUSCATE_IDS_ALPHABET', lib.ALPHANUM)
-		app.config.setdefault('OBFUSCATE_IDS_NUM_CHECK_CHARS', 1)
-		app.config.setdefault('OBFUSCATE_IDS_ALGO_VERSION', 1)
-		# Use the newstyle teardown_appcontext if it's available,
-		# otherwise fall back to the request context
-		if hasattr(app, 'teardown_appcontext'):
-			app.teardown_appcontext(self.teardown)
-		else:
-			app.teardown_request(self.teardown)
-
-	def teardown(self, exception):
-		pass
-
-	def obfuscate(self, num, salt=None, min_length=None):
-		return _current_obfuscator().obfuscate(num=num, salt=salt, min_length=min_length)
-
-	def deobfuscate(self, s, salt=None):
-		return _current_obfuscator().deobfuscate(s=s, salt=salt)
-
-
-def _current_obfuscator():
-	ctx = stack.top
-	if ctx is not None:
-		if not hasattr(ctx, '_obfuscator'):
-			ctx._obfuscator = lib.Obfuscator(
-				key=current_app.config['OBFUSCATE_IDS_KEY'],
-				alphabet=current_app.config['OBFUSCATE_IDS_ALPHABET'],
-				min_length=current_app.config['OBFUSCATE_IDS_MIN_LENGTH'],
-				num_check_chars=current_app.config['OBFUSCATE_IDS_NUM_CHECK_CHARS'],
-				version=current_app.config['OBFUSCATE_IDS_ALGO_VERSION'],
-				)
-		return ctx._obfuscator
-
-
-class ModelMixin():
-	'''Mixin for SQLAlchemy models.
-
-	Two class variables are in place to handle refactoring:
-	__obfuscate_ids_salt__ - by default, just use the class name
-	__obfuscate_ids_attr__ - The attribute of instances of this class to
-		use as the id. Defaults to 'id'
-	If the class name changes, set __obfuscate_ids_salt__ to the old class name
-	to preserve obfuscated ids for that class.
-	'''
-
-	@classmethod
-	def _obfuscate_ids_class_salt(cls):
-		return getattr(cls, '__obfuscate_ids_salt__', '__name__')
-
-	@classmethod
-	def _obfuscate_ids_attr_name(cls):
-		'''Return the name of the attribute to use.'''
-		return getattr(cls, '__obfuscate_ids_attr__', 'id')
-
-	@classmethod
-	def get_from_public_id(cls, public_id, or_abort=None):
-		'''Return the object corresponding to public_id.
-
-		If the public_id is malformed or there is no object with the deobfuscated id,
-		the behavior depends on the or_abort parameter. If or_abort is None, then
-		None is returned. If not, flask.abort is called with or_abort as it's
-		argument (an HTTP status code).
-
-		Args:
-			public_id: The public_id of the object to get
-			or_abort: None or an int status code
-		'''
-		try:
-			ident = _current_obfuscator().deobfuscate(public_id, salt=cls._obfuscate_ids_class_salt())
-		except ValueError:
-			obj = None
-		else:
-			obj = cls.query.get(ident)
-		if obj is None and or_abort is not None:
-			abort(or_abort)
-		else:
-			return obj
-
-	@property
-	def public_id(self):
-		ident_attr = getattr(self, self._obfuscate_ids_attr_name())
-		return _current_obfuscator().obfuscate(ident_attr, salt=self._obfuscate_ids_class_salt())
+# The Flask integration is only imported when one of these is first used, so
+# that using lib doesn't import Flask.
+EXTENSION_NAMES = (
+	'ObfuscateIDs',
+	'ModelMixin',
+	'PublicIDConverter',
+	'CONFIG_NAMES',
+	'models',
+	'public_ids',
+	'public_urls',
+	'metrics_recorded',
+	)
+
+
+def __getattr__(name):
+	if name in EXTENSION_NAMES:
+		from . import extension
+		return getattr(extension, name)
+	raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def __dir__():
+	return sorted(list(globals()) + list(EXTENSION_NAMES))
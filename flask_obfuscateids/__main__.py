@@ -0,0 +1,157 @@
+'''Obfuscate or deobfuscate the id columns of a CSV or JSON lines file.
+
+	python -m flask_obfuscateids encode --column id --salt User users.csv public_users.csv
+	python -m flask_obfuscateids decode --column id --salt User < public_users.jsonl
+
+Or build a table of the public ids of a range of ids, see ObfuscateIDs'
+OBFUSCATE_IDS_TABLES::
+
+	python -m flask_obfuscateids build-table --salt User --stop 1000000 users.tbl
+
+The key is read from the OBFUSCATE_IDS_KEY environment variable unless
+--key is passed. The other options default to the defaults of ObfuscateIDs,
+so they only need to be passed if the app changes them. This doesn't import
+Flask.
+'''
+import argparse
+import os
+import sys
+
+from . import lib, streaming
+
+FORMATS = ('csv', 'jsonl')
+
+
+def _parse_column(value):
+	'''Parse NAME or NAME:SALT.'''
+	name, sep, salt = value.partition(':')
+	return name, (salt if sep else None)
+
+
+def _add_obfuscator_arguments(parser):
+	parser.add_argument('--key', help='Default $OBFUSCATE_IDS_KEY')
+	parser.add_argument('--alphabet', default=lib.ALPHANUM)
+	parser.add_argument('--min-length', type=int, default=8)
+	parser.add_argument('--num-check-chars', type=int, default=1)
+	parser.add_argument('--algo-version', type=int, default=1)
+	parser.add_argument('--max-length', type=int)
+	parser.add_argument('--chunk-size', type=int, default=lib.STREAM_CHUNK_SIZE)
+
+
+def make_parser():
+	parser = argparse.ArgumentParser(
+		prog='python -m flask_obfuscateids',
+		description=__doc__.splitlines()[0],
+		epilog='See python -m flask_obfuscateids build-table --help to build a table.',
+		)
+	parser.add_argument('command', choices=('encode', 'decode'), help='Obfuscate ids or deobfuscate public ids')
+	parser.add_argument('input', nargs='?', default='-', help='The file to read, default stdin')
+	parser.add_argument('output', nargs='?', default='-', help='The file to write, default stdout')
+	parser.add_argument(
+		'--column', '-c', action='append', required=True, type=_parse_column, dest='columns',
+		metavar='NAME[:SALT]', help='A column to rewrite, as NAME or NAME:SALT. Can be repeated.')
+	parser.add_argument('--salt', help='The salt of the columns without one, e.g. a ModelMixin class name')
+	parser.add_argument('--format', choices=FORMATS, help='Default from the extension of input, else csv')
+	parser.add_argument(
+		'--errors', choices=('raise', 'none'), default='raise',
+		help='When decoding, whether to stop at an invalid public id or write an empty value')
+	_add_obfuscator_arguments(parser)
+	return parser
+
+
+def make_table_parser():
+	parser = argparse.ArgumentParser(
+		prog='python -m flask_obfuscateids build-table',
+		description='Build a table of the public ids of a range of ids.',
+		)
+	parser.add_argument('path', help='The table file to write')
+	parser.add_argument('--salt', required=True, help='The salt of the table, e.g. a ModelMixin class name')
+	parser.add_argument('--start', type=int, default=1, help='The first id, default 1')
+	parser.add_argument('--stop', type=int, required=True, help='The id after the last one')
+	parser.add_argument(
+		'--reverse', action='store_true',
+		help='Also write a reverse index, only used to deobfuscate without the C speedups')
+	_add_obfuscator_arguments(parser)
+	return parser
+
+
+def _open(path, mode):
+	if path == '-':
+		stream = sys.stdin if 'r' in mode else sys.stdout
+		return open(stream.fileno(), mode, newline='', closefd=False)
+	return open(path, mode, newline='')
+
+
+def _make_obfuscator(parser, args):
+	key = args.key if args.key is not None else os.environ.get('OBFUSCATE_IDS_KEY')
+	if not key:
+		parser.error('pass --key or set OBFUSCATE_IDS_KEY')
+	try:
+		return lib.Obfuscator(
+			key,
+			alphabet=args.alphabet,
+			min_length=args.min_length,
+			num_check_chars=args.num_check_chars,
+			version=args.algo_version,
+			max_length=args.max_length,
+			)
+	except ValueError as e:
+		parser.error(str(e))
+
+
+def main_build_table(argv):
+	from .table import build_table
+
+	parser = make_table_parser()
+	args = parser.parse_intermixed_args(argv)
+	obfuscator = _make_obfuscator(parser, args)
+	try:
+		build_table(
+			args.path,
+			obfuscator,
+			args.start,
+			args.stop,
+			salt=args.salt,
+			reverse=args.reverse,
+			chunk_size=args.chunk_size,
+			)
+	except ValueError as e:
+		print('error: %s' % (str(e) or 'invalid id'), file=sys.stderr)
+		return 1
+	return 0
+
+
+def main(argv=None):
+	if argv is None:
+		argv = sys.argv[1:]
+	if argv[:1] == ['build-table']:
+		return main_build_table(argv[1:])
+	parser = make_parser()
+	args = parser.parse_intermixed_args(argv)
+	obfuscator = _make_obfuscator(parser, args)
+	fmt = args.format
+	if fmt is None:
+		fmt = 'jsonl' if args.input.endswith(('.jsonl', '.ndjson')) else 'csv'
+	rewrite = streaming.rewrite_jsonl if fmt == 'jsonl' else streaming.rewrite_csv
+	with _open(args.input, 'r') as infile, _open(args.output, 'w') as outfile:
+		try:
+			rewrite(
+				infile,
+				outfile,
+				obfuscator,
+				dict((name, args.salt if salt is None else salt) for name, salt in args.columns),
+				decode=args.command == 'decode',
+				errors=args.errors,
+				chunk_size=args.chunk_size,
+				)
+		except lib.DeobfuscateError as e:
+			print('error: invalid public id (%s)' % e.reason, file=sys.stderr)
+			return 1
+		except ValueError as e:
+			print('error: %s' % (str(e) or 'invalid id'), file=sys.stderr)
+			return 1
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,228 @@
+/*
+ * C implementation of the single pass Obfuscator._obfuscate and
+ * Obfuscator._deobfuscate for ids that fit in 64 bits.
+ *
+ * The key values are passed as a buffer of bytes, so this is only used for
+ * alphabets of at most 256 characters. Anything that doesn't fit is left to
+ * the pure Python implementation in lib.py.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+/* Enough for 64 bits in base 2 */
+#define MAX_NUM_DIGITS 64
+
+/* The exceptions to raise for invalid strings, see set_errors */
+static PyObject *alphabet_error = NULL;
+static PyObject *checksum_error = NULL;
+
+/*
+ * set_errors(alphabet_error, checksum_error)
+ *
+ * Set the ValueError subclasses that deobfuscate raises for characters that
+ * aren't in the alphabet and for check digits that don't match.
+ */
+static PyObject *
+speedups_set_errors(PyObject *self, PyObject *args)
+{
+	PyObject *new_alphabet_error, *new_checksum_error;
+
+	if (!PyArg_ParseTuple(args, "OO", &new_alphabet_error, &new_checksum_error))
+		return NULL;
+	Py_INCREF(new_alphabet_error);
+	Py_XSETREF(alphabet_error, new_alphabet_error);
+	Py_INCREF(new_checksum_error);
+	Py_XSETREF(checksum_error, new_checksum_error);
+	Py_RETURN_NONE;
+}
+
+/*
+ * obfuscate(num, key_values, alphabet, min_length, num_check_chars, checksum_base)
+ *
+ * Raises OverflowError if num is < 0 or doesn't fit in 64 bits and TypeError
+ * if it isn't an int, so the caller can fall back to Python.
+ */
+static PyObject *
+speedups_obfuscate(PyObject *self, PyObject *args)
+{
+	PyObject *num_obj, *alphabet, *result = NULL;
+	Py_buffer key_values;
+	Py_ssize_t min_length, num_check_chars, length, index;
+	unsigned long long num, checksum_base, checksum = 0, digit;
+	unsigned long long moving_value = 0, encrypted;
+	unsigned long long base;
+	Py_UCS4 *out;
+	int kind;
+	const void *data;
+	const unsigned char *keys;
+
+	if (!PyArg_ParseTuple(args, "Oy*UnnK", &num_obj, &key_values, &alphabet,
+			&min_length, &num_check_chars, &checksum_base))
+		return NULL;
+	if (!PyLong_Check(num_obj)) {
+		PyErr_SetString(PyExc_TypeError, "num must be an int");
+		goto done;
+	}
+	num = PyLong_AsUnsignedLongLong(num_obj);
+	if (num == (unsigned long long)-1 && PyErr_Occurred())
+		goto done;
+	base = (unsigned long long)PyUnicode_GET_LENGTH(alphabet);
+	kind = PyUnicode_KIND(alphabet);
+	data = PyUnicode_DATA(alphabet);
+	if (min_length < 0)
+		min_length = 0;
+	length = (min_length > MAX_NUM_DIGITS ? min_length : MAX_NUM_DIGITS) + num_check_chars;
+	if (key_values.len < length) {
+		PyErr_SetString(PyExc_ValueError, "not enough key values");
+		goto done;
+	}
+	out = PyMem_Malloc(length * sizeof(Py_UCS4));
+	if (out == NULL) {
+		PyErr_NoMemory();
+		goto done;
+	}
+	keys = key_values.buf;
+	index = 0;
+	while (num > 0 || index < min_length) {
+		digit = num % base;
+		num /= base;
+		checksum += digit;
+		encrypted = (digit + keys[index] + moving_value) % base;
+		out[index] = PyUnicode_READ(kind, data, encrypted);
+		moving_value = (moving_value + encrypted) % base;
+		index++;
+	}
+	if (num_check_chars) {
+		if (checksum_base)
+			checksum %= checksum_base;
+		for (length = index + num_check_chars; index < length;) {
+			digit = checksum % base;
+			checksum /= base;
+			encrypted = (digit + keys[index] + moving_value) % base;
+			out[index] = PyUnicode_READ(kind, data, encrypted);
+			moving_value = (moving_value + encrypted) % base;
+			index++;
+		}
+	}
+	result = PyUnicode_FromKindAndData(PyUnicode_4BYTE_KIND, out, index);
+	PyMem_Free(out);
+done:
+	PyBuffer_Release(&key_values);
+	return result;
+}
+
+/*
+ * deobfuscate(s, key_values, reverse_table, base, num_check_chars, checksum_base)
+ *
+ * Returns the id or None if it doesn't fit in 64 bits, in which case the
+ * caller falls back to Python. Raises the exceptions from set_errors, or
+ * ValueError if they aren't set, if s is invalid.
+ */
+static PyObject *
+speedups_deobfuscate(PyObject *self, PyObject *args)
+{
+	PyObject *s, *result = NULL;
+	Py_buffer key_values, reverse_table;
+	Py_ssize_t num_check_chars, length, num_length, index;
+	unsigned long long base, checksum_base, checksum = 0, num = 0, digit;
+	unsigned long long moving_value = 0;
+	unsigned char *ints = NULL;
+	int kind, overflow = 0;
+	const void *data;
+	const unsigned char *keys, *table;
+	Py_UCS4 c;
+
+	if (!PyArg_ParseTuple(args, "Uy*y*KnK", &s, &key_values, &reverse_table,
+			&base, &num_check_chars, &checksum_base))
+		return NULL;
+	if (reverse_table.len != 256) {
+		PyErr_SetString(PyExc_ValueError, "reverse_table must be 256 bytes");
+		goto done;
+	}
+	length = PyUnicode_GET_LENGTH(s);
+	num_length = length - num_check_chars;
+	if (num_length < 0) {
+		PyErr_SetNone(checksum_error ? checksum_error : PyExc_ValueError);
+		goto done;
+	}
+	if (key_values.len < length) {
+		PyErr_SetString(PyExc_ValueError, "not enough key values");
+		goto done;
+	}
+	ints = PyMem_Malloc(length ? length : 1);
+	if (ints == NULL) {
+		PyErr_NoMemory();
+		goto done;
+	}
+	keys = key_values.buf;
+	table = reverse_table.buf;
+	kind = PyUnicode_KIND(s);
+	data = PyUnicode_DATA(s);
+	/* Decode and decrypt */
+	for (index = 0; index < length; index++) {
+		c = PyUnicode_READ(kind, data, index);
+		if (c >= 256 || table[c] == 255) {
+			PyErr_SetNone(alphabet_error ? alphabet_error : PyExc_ValueError);
+			goto done;
+		}
+		ints[index] = (unsigned char)((table[c] + 2 * base - keys[index] - moving_value) % base);
+		moving_value = (moving_value + table[c]) % base;
+	}
+	/* Decode base n */
+	for (index = num_length - 1; index >= 0; index--) {
+		digit = ints[index];
+		checksum += digit;
+		if (num > (ULLONG_MAX - digit) / base)
+			overflow = 1;
+		num = num * base + digit;
+	}
+	/* Check digits */
+	if (num_check_chars) {
+		if (checksum_base)
+			checksum %= checksum_base;
+		for (index = num_length; index < length; index++) {
+			digit = checksum % base;
+			checksum /= base;
+			if (ints[index] != digit) {
+				PyErr_SetNone(checksum_error ? checksum_error : PyExc_ValueError);
+				goto done;
+			}
+		}
+	}
+	if (overflow) {
+		Py_INCREF(Py_None);
+		result = Py_None;
+	}
+	else {
+		result = PyLong_FromUnsignedLongLong(num);
+	}
+done:
+	PyMem_Free(ints);
+	PyBuffer_Release(&key_values);
+	PyBuffer_Release(&reverse_table);
+	return result;
+}
+
+static PyMethodDef speedups_methods[] = {
+	{"set_errors", speedups_set_errors, METH_VARARGS,
+		"Set the exceptions to raise for invalid characters and check digits."},
+	{"obfuscate", speedups_obfuscate, METH_VARARGS,
+		"Obfuscate an id that fits in 64 bits."},
+	{"deobfuscate", speedups_deobfuscate, METH_VARARGS,
+		"Deobfuscate a string, returning None if the id doesn't fit in 64 bits."},
+	{NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef speedups_module = {
+	PyModuleDef_HEAD_INIT,
+	"flask_obfuscateids._speedups",
+	"C implementation of the Obfuscator hot path.",
+	-1,
+	speedups_methods
+};
+
+PyMODINIT_FUNC
+PyInit__speedups(void)
+{
+	return PyModule_Create(&speedups_module);
+}
@@ -0,0 +1,245 @@
+'''Bounded, thread-safe LRU caches that count their hits, misses and evictions.'''
+from collections import OrderedDict, namedtuple
+from itertools import count
+from threading import Lock, current_thread, local
+
+CacheInfo = namedtuple('CacheInfo', ('hits', 'misses', 'evictions', 'maxsize', 'currsize'))
+
+
+class LRUCache():
+	'''A mapping of at most maxsize items, evicting the least recently used.
+
+	All methods are safe to call from multiple threads.
+	'''
+
+	def __init__(self, maxsize):
+		if not isinstance(maxsize, int) or maxsize < 1:
+			raise ValueError('maxsize must be an int >= 1')
+		self.maxsize = maxsize
+		self._data = OrderedDict()
+		self._lock = Lock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def __len__(self):
+		return len(self._data)
+
+	def get(self, key, default=None):
+		'''Return the value for key and mark it as recently used, or default.'''
+		with self._lock:
+			try:
+				value = self._data[key]
+			except KeyError:
+				self.misses += 1
+				return default
+			self._data.move_to_end(key)
+			self.hits += 1
+			return value
+
+	def set(self, key, value):
+		'''Set the value for key, evicting the least recently used item if full.'''
+		with self._lock:
+			if key in self._data:
+				self._data.move_to_end(key)
+			elif len(self._data) >= self.maxsize:
+				self._data.popitem(last=False)
+				self.evictions += 1
+			self._data[key] = value
+
+	def clear(self):
+		'''Remove all items and reset the counters.'''
+		with self._lock:
+			self._data.clear()
+			self.hits = 0
+			self.misses = 0
+			self.evictions = 0
+
+	def info(self):
+		'''Return a CacheInfo of the counters and sizes.'''
+		with self._lock:
+			return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._data))
+
+
+class CopyOnWriteLRUCache():
+	'''An LRUCache that looks items up without taking a lock.
+
+	The items are kept in a dict that is replaced rather than modified when
+	an item is set or evicted, and each item records when it was last used.
+	get only takes the lock to count a miss, so this suits caches that are
+	read far more often than they are written. Hits are counted without the
+	lock, so under heavy concurrency a few of them may not be counted.
+	'''
+
+	def __init__(self, maxsize):
+		if not isinstance(maxsize, int) or maxsize < 1:
+			raise ValueError('maxsize must be an int >= 1')
+		self.maxsize = maxsize
+		# Keys to [value, the tick of the last use]
+		self._data = {}
+		self._ticks = count()
+		self._lock = Lock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def __len__(self):
+		return len(self._data)
+
+	def get(self, key, default=None):
+		'''Return the value for key and mark it as recently used, or default.'''
+		try:
+			item = self._data[key]
+		except KeyError:
+			with self._lock:
+				self.misses += 1
+			return default
+		item[1] = next(self._ticks)
+		self.hits += 1
+		return item[0]
+
+	def set(self, key, value):
+		'''Set the value for key, evicting the least recently used item if full.'''
+		with self._lock:
+			data = dict(self._data)
+			if key not in data and len(data) >= self.maxsize:
+				del data[min(data, key=lambda old_key: data[old_key][1])]
+				self.evictions += 1
+			data[key] = [value, next(self._ticks)]
+			self._data = data
+
+	def clear(self):
+		'''Remove all items and reset the counters.'''
+		with self._lock:
+			self._data = {}
+			self.hits = 0
+			self.misses = 0
+			self.evictions = 0
+
+	def info(self):
+		'''Return a CacheInfo of the counters and sizes.'''
+		with self._lock:
+			return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._data))
+
+
+class _Shard():
+	'''The items and counters of one thread of a ThreadLocalLRUCache.'''
+
+	def __init__(self):
+		self.data = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+
+class _Totals():
+	'''The shards of the live threads of a ThreadLocalLRUCache and the counters of the dead ones.
+
+	The shards of threads that have exited are merged into the counters the
+	next time a shard is added or the totals are read. This only depends on
+	Thread.is_alive, not on when the garbage collector frees the shard.
+	'''
+
+	def __init__(self):
+		self.lock = Lock()
+		# Shards to the threads they belong to
+		self.shards = {}
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def add(self, shard):
+		with self.lock:
+			self._merge_dead()
+			self.shards[shard] = current_thread()
+
+	def remove(self, shard):
+		'''Drop shard along with its counters.'''
+		with self.lock:
+			self.shards.pop(shard, None)
+
+	def live_shards(self):
+		'''Return the shards of the live threads, call with lock held.'''
+		self._merge_dead()
+		return list(self.shards)
+
+	def _merge_dead(self):
+		for shard, thread in list(self.shards.items()):
+			if not thread.is_alive():
+				del self.shards[shard]
+				self._merge(shard)
+
+	def _merge(self, shard):
+		self.hits += shard.hits
+		self.misses += shard.misses
+		self.evictions += shard.evictions
+
+
+class ThreadLocalLRUCache():
+	'''An LRUCache with a separate shard of up to maxsize items per thread.
+
+	Each thread only ever touches its own shard, so get and set take no lock. info
+	adds up the counters of all threads, including those that have exited,
+	and the sizes of the shards of the live ones.
+	'''
+
+	def __init__(self, maxsize):
+		if not isinstance(maxsize, int) or maxsize < 1:
+			raise ValueError('maxsize must be an int >= 1')
+		self.maxsize = maxsize
+		self._local = local()
+		# The shards of exited threads are merged into these
+		self._totals = _Totals()
+
+	def _shard(self):
+		try:
+			return self._local.shard
+		except AttributeError:
+			shard = self._local.shard = _Shard()
+			self._totals.add(shard)
+			return shard
+
+	def __len__(self):
+		return len(self._shard().data)
+
+	def get(self, key, default=None):
+		'''Return the value for key and mark it as recently used, or default.'''
+		shard = self._shard()
+		try:
+			value = shard.data[key]
+		except KeyError:
+			shard.misses += 1
+			return default
+		shard.data.move_to_end(key)
+		shard.hits += 1
+		return value
+
+	def set(self, key, value):
+		'''Set the value for key, evicting the least recently used item if full.'''
+		shard = self._shard()
+		if key in shard.data:
+			shard.data.move_to_end(key)
+		elif len(shard.data) >= self.maxsize:
+			shard.data.popitem(last=False)
+			shard.evictions += 1
+		shard.data[key] = value
+
+	def clear(self):
+		'''Remove all items and reset the counters of this thread's shard.'''
+		shard = self._local.__dict__.pop('shard', None)
+		if shard is not None:
+			self._totals.remove(shard)
+
+	def info(self):
+		'''Return a CacheInfo of the counters and sizes summed over all threads.'''
+		totals = self._totals
+		with totals.lock:
+			shards = totals.live_shards()
+			info = CacheInfo(
+				totals.hits + sum(shard.hits for shard in shards),
+				totals.misses + sum(shard.misses for shard in shards),
+				totals.evictions + sum(shard.evictions for shard in shards),
+				self.maxsize,
+				sum(len(shard.data) for shard in shards),
+				)
+		return info
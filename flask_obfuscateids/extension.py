@@ -0,0 +1,634 @@
+# -*- coding: utf-8 -*-
+'''
+flask_obfuscateids.extension
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The Flask integration, importing this imports Flask. The names are also
+available from flask_obfuscateids.
+'''
+from __future__ import absolute_import, unicode_literals
+
+from collections import OrderedDict
+from operator import itemgetter
+
+from flask import current_app, abort, g, has_app_context, url_for
+from flask.signals import Namespace
+from werkzeug.routing import BaseConverter, ValidationError
+
+from . import lib
+from .cache import CopyOnWriteLRUCache
+from .metrics import Metrics, InstrumentedObfuscator
+
+# The config values used to build an Obfuscator, in the order of its arguments
+CONFIG_NAMES = (
+	'OBFUSCATE_IDS_KEY',
+	'OBFUSCATE_IDS_ALPHABET',
+	'OBFUSCATE_IDS_MIN_LENGTH',
+	'OBFUSCATE_IDS_NUM_CHECK_CHARS',
+	'OBFUSCATE_IDS_ALGO_VERSION',
+	'OBFUSCATE_IDS_MAX_LENGTH',
+	'OBFUSCATE_IDS_CACHE_SIZE',
+	'OBFUSCATE_IDS_NEGATIVE_CACHE_SIZE',
+	'OBFUSCATE_IDS_TABLES',
+	)
+
+# Returns the tuple of the CONFIG_NAMES values of a config, much faster than a loop
+_config_values = itemgetter(*CONFIG_NAMES)
+
+_signals = Namespace()
+
+# Sent with the app and its Metrics as metrics at the end of each app context
+# that used the obfuscator, if OBFUSCATE_IDS_METRICS is set
+metrics_recorded = _signals.signal('obfuscate-ids-metrics-recorded')
+
+
+class ObfuscateIDs():
+
+	def __init__(self, app=None):
+		self.app = app
+		self._tenant_resolver = None
+		self._tenant_key_loader = None
+		self._metrics_sinks = []
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		app.config.setdefault('OBFUSCATE_IDS_KEY', app.config['SECRET_KEY'])
+		app.config.setdefault('OBFUSCATE_IDS_MIN_LENGTH', 8)
+		app.config.setdefault('OBFUSCATE_IDS_ALPHABET', lib.ALPHANUM)
+		app.config.setdefault('OBFUSCATE_IDS_NUM_CHECK_CHARS', 1)
+		app.config.setdefault('OBFUSCATE_IDS_ALGO_VERSION', 1)
+		app.config.setdefault('OBFUSCATE_IDS_MAX_LENGTH', None)
+		app.config.setdefault('OBFUSCATE_IDS_CACHE_SIZE', 0)
+		app.config.setdefault('OBFUSCATE_IDS_NEGATIVE_CACHE_SIZE', 0)
+		app.config.setdefault('OBFUSCATE_IDS_TENANT_CACHE_SIZE', 128)
+		app.config.setdefault('OBFUSCATE_IDS_METRICS', False)
+		app.config.setdefault('OBFUSCATE_IDS_TABLES', {})
+		if not hasattr(app, 'extensions'):
+			app.extensions = {}
+		app.extensions['obfuscateids'] = {'extension': self}
+		app.url_map.converters['pubid'] = PublicIDConverter
+		app.add_template_filter(public_ids, 'public_ids')
+		app.add_template_filter(public_urls, 'public_urls')
+		# Use the newstyle teardown_appcontext if it's available,
+		# otherwise fall back to the request context
+		if hasattr(app, 'teardown_appcontext'):
+			app.teardown_appcontext(self.teardown)
+		else:
+			app.teardown_request(self.teardown)
+
+	def teardown(self, exception):
+		metrics = g.pop('_obfuscate_ids_metrics', None)
+		if metrics:
+			metrics_recorded.send(current_app._get_current_object(), metrics=metrics)
+			for sink in self._metrics_sinks:
+				sink(metrics)
+
+	def metrics_sink(self, callback):
+		'''Add a callback to pass the Metrics of each app context to.
+
+		It is called at the end of each app context (usually a request) that
+		used the obfuscator, if OBFUSCATE_IDS_METRICS is set. See
+		metrics.prometheus_sink.
+		'''
+		self._metrics_sinks.append(callback)
+		return callback
+
+	def current_metrics(self):
+		'''Return the Metrics of the current app context so far, or None.'''
+		return g.get('_obfuscate_ids_metrics')
+
+	def tenant_resolver(self, callback):
+		'''Set the callback that returns the tenant of the current request.
+
+		The tenant can be any hashable value. If the callback returns None,
+		the obfuscator for OBFUSCATE_IDS_KEY is used. It is called whenever
+		an obfuscator is needed without a tenant being passed, so it should
+		return None outside of requests. The pubid converter calls it during
+		routing, before any before_request functions run, so it should get
+		the tenant from the request itself rather than from g. Use it as a
+		decorator along with tenant_key_loader::
+
+			@obfuscate_ids.tenant_resolver
+			def current_tenant():
+				if has_request_context():
+					return request.headers.get('X-Tenant-ID')
+
+			@obfuscate_ids.tenant_key_loader
+			def tenant_key(tenant_id):
+				return Tenant.query.get(tenant_id).obfuscate_ids_key
+		'''
+		self._tenant_resolver = callback
+		return callback
+
+	def tenant_key_loader(self, callback):
+		'''Set the callback that returns the key of a tenant.
+
+		It is only called when the obfuscator of the tenant isn't in the
+		tenant cache. The rest of the config is shared by all tenants.
+		'''
+		self._tenant_key_loader = callback
+		return callback
+
+	def tenant_cache_info(self, app=None):
+		'''Return the CacheInfo of the per-tenant obfuscators of app.
+
+		Args:
+			app: The app, defaults to self.app and then current_app
+		'''
+		if app is None:
+			app = self.app or current_app._get_current_object()
+		return _tenant_cache(app).info()
+
+	def prewarm(self, app=None, salts=None, max_length=None):
+		'''Do all of the setup of the obfuscator for app ahead of the first request.
+
+		This builds the obfuscator, generates the key values for ids of up to
+		max_length characters for each salt and binds every ModelMixin class to
+		its salted obfuscator. Call it once the app is configured, e.g. at the
+		end of an app factory, or in the master process of a preforking server
+		so that the workers share the result.
+
+		Args:
+			app: The app to build the obfuscator for, defaults to self.app
+			salts: Salts to generate the key values for, defaults to no salt
+				and the salts of all ModelMixin classes
+			max_length: The length of the ids to generate key values for if
+				longer than the key values that obfuscate always asks for,
+				which are enough for any 64 bit id. Defaults to
+				OBFUSCATE_IDS_MAX_LENGTH. The obfuscator doesn't keep key values
+				beyond that, so a longer max_length has no effect.
+		'''
+		obfuscator = self.get_obfuscator(app)
+		if salts is None:
+			salts = [None] + [model._obfuscate_ids_salt for model in _all_models()]
+		# The length Obfuscator.obfuscate asks for, so that workers don't grow the key values
+		length = max(64, obfuscator.min_length) + obfuscator.num_check_chars
+		if max_length is None:
+			max_length = obfuscator.max_length
+		if max_length is not None:
+			length = max(length, max_length)
+		for salt in salts:
+			obfuscator.for_salt(salt)._keystream(None).get(length)
+		if app is None:
+			app = self.app or current_app._get_current_object()
+		for model in _all_models():
+			model._obfuscate_ids_obfuscator(app)
+		return obfuscator
+
+	def get_obfuscator(self, app=None, tenant=None):
+		'''Return the shared Obfuscator for app.
+
+		This doesn't need an app context if app is passed or this was
+		created with an app, so it can be used from background tasks and
+		async code.
+
+		Args:
+			app: The app, defaults to self.app and then current_app
+			tenant: The tenant to return the obfuscator of, defaults to the
+				one returned by the tenant_resolver callback, if any
+		'''
+		if app is None:
+			app = self.app
+		if app is None:
+			app = current_app._get_current_object()
+		return _get_obfuscator(app, tenant)
+
+	def obfuscate(self, num, salt=None, min_length=None):
+		return self.get_obfuscator().obfuscate(num=num, salt=salt, min_length=min_length)
+
+	def deobfuscate(self, s, salt=None):
+		return self.get_obfuscator().deobfuscate(s=s, salt=salt)
+
+	def obfuscate_many(self, nums, salt=None, min_length=None, parallel=None):
+		return self.get_obfuscator().obfuscate_many(nums, salt=salt, min_length=min_length, parallel=parallel)
+
+	def deobfuscate_many(self, strings, salt=None, errors='raise', parallel=None):
+		return self.get_obfuscator().deobfuscate_many(strings, salt=salt, errors=errors, parallel=parallel)
+
+	def obfuscate_stream(self, nums, salt=None, min_length=None, chunk_size=lib.STREAM_CHUNK_SIZE, parallel=None):
+		return self.get_obfuscator().obfuscate_stream(
+			nums, salt=salt, min_length=min_length, chunk_size=chunk_size, parallel=parallel)
+
+	def deobfuscate_stream(self, strings, salt=None, errors='raise', chunk_size=lib.STREAM_CHUNK_SIZE, parallel=None):
+		return self.get_obfuscator().deobfuscate_stream(
+			strings, salt=salt, errors=errors, chunk_size=chunk_size, parallel=parallel)
+
+
+def _get_obfuscator(app, tenant=None):
+	'''Return the Obfuscator for app, shared by all requests and threads.
+
+	If a tenant is passed or resolved, return the obfuscator of the tenant
+	instead. If OBFUSCATE_IDS_METRICS is set and there is an app context, it
+	is wrapped to record its calls in the Metrics of the app context.
+	'''
+	obfuscator = _get_shared_obfuscator(app, tenant)
+	if app.config['OBFUSCATE_IDS_METRICS'] and has_app_context():
+		return InstrumentedObfuscator(obfuscator, _current_metrics())
+	return obfuscator
+
+
+def _current_metrics():
+	metrics = g.get('_obfuscate_ids_metrics')
+	if metrics is None:
+		metrics = g._obfuscate_ids_metrics = Metrics()
+	return metrics
+
+
+def _get_shared_obfuscator(app, tenant=None):
+	'''Return the Obfuscator for app or tenant, see _get_obfuscator.
+
+	It is rebuilt if any of the config values in CONFIG_NAMES have changed.
+	'''
+	state = app.extensions['obfuscateids']
+	config = _config_values(app.config)
+	if tenant is None:
+		resolver = state['extension']._tenant_resolver
+		if resolver is not None:
+			tenant = resolver()
+	if tenant is not None:
+		return _get_tenant_obfuscator(app, config, tenant)
+	# Read the pair at once so that concurrent rebuilds can't mix them up
+	cached = state.get('obfuscator')
+	if cached is not None and cached[0] == config:
+		return cached[1]
+	obfuscator = _build_obfuscator(config)
+	_use_tables(obfuscator, config[8])
+	state['obfuscator'] = (config, obfuscator)
+	if cached is not None:
+		# Unmap the tables of the old obfuscator
+		cached[1].close()
+	return obfuscator
+
+
+def _tenant_cache(app):
+	'''Return the CopyOnWriteLRUCache of the per-tenant obfuscators of app.
+
+	It is replaced, and so emptied, if OBFUSCATE_IDS_TENANT_CACHE_SIZE changes.
+	'''
+	state = app.extensions['obfuscateids']
+	size = app.config['OBFUSCATE_IDS_TENANT_CACHE_SIZE']
+	tenants = state.get('tenants')
+	if tenants is None or tenants.maxsize != size:
+		tenants = state['tenants'] = CopyOnWriteLRUCache(size)
+	return tenants
+
+
+def _get_tenant_obfuscator(app, config, tenant):
+	'''Return the Obfuscator of tenant, built with its key and the rest of config.
+
+	The obfuscators of the most recently used tenants are kept, the others
+	are built again the next time they are used.
+	'''
+	tenants = _tenant_cache(app)
+	cached = tenants.get(tenant)
+	if cached is not None and cached[0] == config:
+		return cached[1]
+	key_loader = app.extensions['obfuscateids']['extension']._tenant_key_loader
+	if key_loader is None:
+		raise LookupError('No tenant_key_loader is set')
+	key = key_loader(tenant)
+	if key is None:
+		raise LookupError('No key for tenant %r' % (tenant, ))
+	obfuscator = _build_obfuscator((key, ) + config[1:])
+	tenants.set(tenant, (config, obfuscator))
+	return obfuscator
+
+
+def _build_obfuscator(config):
+	'''Return a new Obfuscator for the values of CONFIG_NAMES in config.'''
+	return lib.Obfuscator(
+		key=config[0],
+		alphabet=config[1],
+		min_length=config[2],
+		num_check_chars=config[3],
+		version=config[4],
+		max_length=config[5],
+		cache_size=config[6],
+		negative_cache_size=config[7],
+		)
+
+
+def _use_tables(obfuscator, tables):
+	'''Open the table files of OBFUSCATE_IDS_TABLES, a dict of salt to path, for obfuscator.
+
+	Tenants don't use them, the tables are built with the app's key.
+	'''
+	if not tables:
+		return
+	from .table import PublicIDTable
+	for salt, path in tables.items():
+		obfuscator.use_table(PublicIDTable(path, obfuscator, salt))
+
+
+def _current_obfuscator():
+	return _get_obfuscator(current_app._get_current_object())
+
+
+class PublicIDConverter(BaseConverter):
+	'''URL converter between public ids in URLs and ids in views.
+
+	ObfuscateIDs registers it as pubid:
+	<pubid(User):user_id> - Use the salt of the ModelMixin class named User
+	<pubid(salt='abc'):abc_id> - Use the salt 'abc'
+	<pubid:some_id> - Don't use a salt
+
+	A malformed public id doesn't match the rule, so the request is a 404
+	before the view runs. url_for accepts either an id or an object with a
+	public_id attribute.
+	'''
+
+	def __init__(self, map, model=None, salt=None):
+		super(PublicIDConverter, self).__init__(map)
+		self.model = model
+		self.salt = salt
+
+	def _obfuscator(self):
+		if self.model is None:
+			return _current_obfuscator().for_salt(self.salt)
+		try:
+			model = models[self.model]
+		except KeyError:
+			ambiguous = _ambiguous_models.get(self.model)
+			if ambiguous:
+				raise LookupError('%s are all ModelMixin classes named %r, set __obfuscate_ids_name__ on them' % (
+					', '.join('%s.%s' % (model.__module__, model.__qualname__) for model in ambiguous),
+					self.model))
+			raise LookupError('No ModelMixin class named %r' % self.model)
+		return model._obfuscate_ids_obfuscator()
+
+	def to_python(self, value):
+		try:
+			return self._obfuscator().deobfuscate(value)
+		except ValueError:
+			raise ValidationError()
+
+	def to_url(self, value):
+		public_id = getattr(value, 'public_id', None)
+		if public_id is None:
+			public_id = self._obfuscator().obfuscate(value)
+		return super(PublicIDConverter, self).to_url(public_id)
+
+
+# Characters that are never quoted in URLs
+URL_SAFE_CHARS = frozenset('0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ-._~')
+
+
+def public_ids(items, salt=None):
+	'''Return the public ids of items in one pass over the obfuscator.
+
+	This is registered as the public_ids template filter: {{ items|public_ids }}
+
+	Args:
+		items: An iterable of ModelMixin instances or of ids
+		salt: The salt to use for ids, ModelMixin instances use their class salt
+	'''
+	items = list(items)
+	if not items:
+		return []
+	model = type(items[0])
+	if not isinstance(items[0], ModelMixin):
+		return _current_obfuscator().for_salt(salt).obfuscate_many(items)
+	if all(type(item) is model for item in items):
+		attr = model._obfuscate_ids_attr
+		return model._obfuscate_ids_obfuscator().obfuscate_many([getattr(item, attr) for item in items])
+	return [item.public_id for item in items]
+
+
+class _PublicID():
+	'''A public id to pass to url_for, for either a string or pubid converter.'''
+
+	def __init__(self, public_id):
+		self.public_id = public_id
+
+	def __str__(self):
+		return self.public_id
+
+
+def public_urls(items, endpoint, arg_name='public_id', salt=None, **values):
+	'''Return the URLs for endpoint with the public id of each of items.
+
+	url_for is only called once, the URL for each item is made by replacing
+	the public id in it. If that isn't possible, url_for is called for each.
+
+	This is registered as the public_urls template filter:
+	{{ items|public_urls('item') }}
+
+	Args:
+		items: An iterable of ModelMixin instances or of ids
+		endpoint: The endpoint to build URLs for
+		arg_name: The name of the endpoint's argument for the public id
+		salt: The salt to use for ids, ModelMixin instances use their class salt
+		values: Other arguments to url_for
+	'''
+	ids = public_ids(items, salt=salt)
+	if not ids:
+		return []
+	values[arg_name] = _PublicID(ids[0])
+	url = url_for(endpoint, **values)
+	alphabet = current_app.config['OBFUSCATE_IDS_ALPHABET']
+	if url.count(ids[0]) != 1 or not URL_SAFE_CHARS.issuperset(alphabet):
+		urls = [url]
+		for public_id in ids[1:]:
+			values[arg_name] = _PublicID(public_id)
+			urls.append(url_for(endpoint, **values))
+		return urls
+	prefix, _, suffix = url.partition(ids[0])
+	return [prefix + public_id + suffix for public_id in ids]
+
+
+# The classes using ModelMixin by name, see __obfuscate_ids_name__
+models = {}
+# The names shared by more than one class to those classes, they aren't in models
+_ambiguous_models = {}
+
+
+def _all_models():
+	'''Return all ModelMixin classes, including those that share a name.'''
+	return list(models.values()) + [
+		model for ambiguous in _ambiguous_models.values() for model in ambiguous]
+
+
+def _register_model(name, cls):
+	'''Add cls to models under name, unless another class already uses it.
+
+	The same class defined again, e.g. by reloading its module, replaces it.
+	'''
+	def is_cls(other):
+		return (other.__module__, other.__qualname__) == (cls.__module__, cls.__qualname__)
+
+	if name in _ambiguous_models:
+		_ambiguous_models[name] = [other for other in _ambiguous_models[name] if not is_cls(other)] + [cls]
+		return
+	registered = models.get(name)
+	if registered is None or is_cls(registered):
+		models[name] = cls
+	else:
+		del models[name]
+		_ambiguous_models[name] = [registered, cls]
+
+
+class ModelMixin():
+	'''Mixin for SQLAlchemy models.
+
+	Three class variables are in place to handle refactoring:
+	__obfuscate_ids_salt__ - by default, just use the class name
+	__obfuscate_ids_attr__ - The attribute of instances of this class to
+		use as the id. Defaults to 'id'
+	__obfuscate_ids_name__ - The name to register the class under in models,
+		e.g. for pubid(name). Defaults to the class name
+	If the class name changes, set __obfuscate_ids_salt__ to the old class name
+	to preserve obfuscated ids for that class.
+
+	They are read once, when the class is created. Subclasses read them
+	again, so a subclass gets its own salt unless a parent class sets
+	__obfuscate_ids_salt__.
+
+	If another class already uses the name, e.g. a model with the same class
+	name in another module, neither is in models and pubid(name) raises
+	LookupError.
+	'''
+
+	def __init_subclass__(cls, **kwargs):
+		super().__init_subclass__(**kwargs)
+		cls._obfuscate_ids_salt = getattr(cls, '__obfuscate_ids_salt__', cls.__name__)
+		cls._obfuscate_ids_attr = getattr(cls, '__obfuscate_ids_attr__', 'id')
+		cls._obfuscate_ids_bound = None
+		_register_model(cls.__dict__.get('__obfuscate_ids_name__', cls.__name__), cls)
+
+	@classmethod
+	def _obfuscate_ids_class_salt(cls):
+		return cls._obfuscate_ids_salt
+
+	@classmethod
+	def _obfuscate_ids_attr_name(cls):
+		'''Return the name of the attribute to use.'''
+		return cls._obfuscate_ids_attr
+
+	@classmethod
+	def _obfuscate_ids_obfuscator(cls, app=None):
+		'''Return the obfuscator of app (default current_app) for the class salt.
+
+		See Obfuscator.for_salt.
+		'''
+		if app is None:
+			obfuscator = _current_obfuscator()
+		else:
+			obfuscator = _get_obfuscator(app)
+		bound = cls._obfuscate_ids_bound
+		if bound is not None and bound[0] is obfuscator:
+			return bound[1]
+		salted = obfuscator.for_salt(cls._obfuscate_ids_salt)
+		cls._obfuscate_ids_bound = (obfuscator, salted)
+		return salted
+
+	@classmethod
+	def get_from_public_id(cls, public_id, or_abort=None):
+		'''Return the object corresponding to public_id.
+
+		If the public_id is malformed or there is no object with the deobfuscated id,
+		the behavior depends on the or_abort parameter. If or_abort is None, then
+		None is returned. If not, flask.abort is called with or_abort as it's
+		argument (an HTTP status code).
+
+		Args:
+			public_id: The public_id of the object to get
+			or_abort: None or an int status code
+		'''
+		try:
+			ident = cls._obfuscate_ids_obfuscator().deobfuscate(public_id)
+		except ValueError:
+			obj = None
+		else:
+			obj = cls.query.get(ident)
+		if obj is None and or_abort is not None:
+			abort(or_abort)
+		else:
+			return obj
+
+	@classmethod
+	async def aget_from_public_id(cls, session, public_id, or_abort=None, app=None):
+		'''Return the object corresponding to public_id from an async session.
+
+		This is get_from_public_id for async SQLAlchemy, the object is loaded
+		with ``await session.get(cls, ident)``. If app is passed, no app context
+		is needed.
+
+		Args:
+			session: A sqlalchemy.ext.asyncio.AsyncSession
+			public_id: The public_id of the object to get
+			or_abort: None or an int status code
+			app: The app whose obfuscator to use, defaults to current_app
+		'''
+		try:
+			ident = cls._obfuscate_ids_obfuscator(app).deobfuscate(public_id)
+		except ValueError:
+			obj = None
+		else:
+			obj = await session.get(cls, ident)
+		if obj is None and or_abort is not None:
+			abort(or_abort)
+		else:
+			return obj
+
+	@classmethod
+	def get_many_from_public_ids(cls, public_ids, or_abort=None, chunk_size=500):
+		'''Return the objects corresponding to public_ids and the missing public_ids.
+
+		All of the objects are loaded with one IN query per chunk_size ids
+		instead of one query each.
+
+		If any public_id is malformed or there is no object with its deobfuscated
+		id, the behavior depends on the or_abort parameter. If or_abort is None,
+		it is added to the missing list. If not, flask.abort is called with
+		or_abort as it's argument (an HTTP status code).
+
+		Args:
+			public_ids: An iterable of the public_ids of the objects to get
+			or_abort: None or an int status code
+			chunk_size: The maximum number of ids in a single query
+		Returns:
+			A tuple of the list of objects found, in the order of public_ids,
+			and the list of public_ids that weren't.
+		'''
+		public_ids = list(public_ids)
+		idents = cls._obfuscate_ids_obfuscator().deobfuscate_many(public_ids, errors='none')
+		attr_name = cls._obfuscate_ids_attr
+		column = getattr(cls, attr_name)
+		wanted = list(OrderedDict.fromkeys(ident for ident in idents if ident is not None))
+		objs_by_ident = {}
+		for start in range(0, len(wanted), chunk_size):
+			chunk = wanted[start:start + chunk_size]
+			for obj in cls.query.filter(column.in_(chunk)):
+				objs_by_ident[getattr(obj, attr_name)] = obj
+		objs = []
+		missing = []
+		for public_id, ident in zip(public_ids, idents):
+			obj = objs_by_ident.get(ident)
+			if obj is None:
+				missing.append(public_id)
+			else:
+				objs.append(obj)
+		if missing and or_abort is not None:
+			abort(or_abort)
+		return objs, missing
+
+	@property
+	def public_id(self):
+		'''The obfuscated id of this object.
+
+		The value is remembered in the instance __dict__ along with the id and
+		obfuscator it was computed with, so it is recomputed if either changes.
+		'''
+		ident_attr = getattr(self, self._obfuscate_ids_attr)
+		obfuscator = self._obfuscate_ids_obfuscator()
+		try:
+			instance_dict = self.__dict__
+		except AttributeError:
+			instance_dict = {}
+		cached = instance_dict.get('_obfuscate_ids_public_id')
+		if cached is not None and cached[0] is obfuscator.token and cached[1] == ident_attr:
+			return cached[2]
+		public_id = obfuscator.obfuscate(ident_attr)
+		instance_dict['_obfuscate_ids_public_id'] = (obfuscator.token, ident_attr, public_id)
+		return public_id
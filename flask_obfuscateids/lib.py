@@ -1,7 +1,19 @@
 
+from collections import deque
+from functools import partial
+from itertools import islice
+import math
+import os
+import operator
 from random import Random
+import sys
 
-from collections_extended import setlist
+from .cache import ThreadLocalLRUCache
+
+try:
+	from . import _speedups
+except ImportError:
+	_speedups = None
 
 # The version of seeding to use for random
 SEED_VERSION = 2
@@ -10,6 +22,40 @@ SEED_VERSION = 2
 ALPHANUM = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
 BASE58 = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
 
+# The number of ids obfuscate_stream and deobfuscate_stream handle at a time
+STREAM_CHUNK_SIZE = 10000
+
+# Chunks smaller than this aren't worth converting to NumPy arrays
+MIN_VECTORIZED_CHUNK_SIZE = 1000
+
+
+class DeobfuscateError(ValueError):
+	'''A string can't be deobfuscated, e.g. because it isn't a string.
+
+	reason is a short name of the cause, the subclasses set it to the more
+	specific causes.
+	'''
+	reason = 'invalid'
+
+
+class AlphabetError(DeobfuscateError):
+	'''A string contains characters that aren't in the alphabet.'''
+	reason = 'alphabet'
+
+
+class ChecksumError(DeobfuscateError):
+	'''The check characters of a string don't match, or it's too short to have them.'''
+	reason = 'checksum'
+
+
+class TooLongError(DeobfuscateError):
+	'''A string is longer than the max_length of the Obfuscator.'''
+	reason = 'too_long'
+
+
+if _speedups is not None:
+	_speedups.set_errors(AlphabetError, ChecksumError)
+
 
 def shuffle(key, x):
 	random = Random(key)
@@ -43,10 +89,10 @@ def encode_base_n(num, base, min_length=0):
 def decode_base_n(int_list, base):
 	'''Convert a list of numbers representing a number in base base to an integer.'''
 	out = 0
-	for index, num in enumerate(int_list):
+	for num in reversed(int_list):
 		if num >= base or num < 0:
 			raise ValueError
-		out += (base ** index) * num
+		out = out * base + num
 	return out
 
 
@@ -79,14 +125,14 @@ def eval_check_digits(decrypted_ints, base, num_check_chars):
 	Returns:
 		The decrypted_ints without the check digits
 	Raises:
-		ValueError: if the check digits don't match
+		ChecksumError: if the check digits don't match
 	'''
 	if num_check_chars == 0:
 		return decrypted_ints
 	int_list = decrypted_ints[:-num_check_chars]
 	check_digits = decrypted_ints[-num_check_chars:]
 	if calc_check_digits(int_list, base, num_check_chars) != check_digits:
-		raise ValueError()
+		raise ChecksumError()
 	return int_list
 
 
@@ -104,14 +150,55 @@ def decode(s, alphabet):
 	'''Decode a string s using alphabet returning a list of ints.'''
 	try:
 		return [alphabet.index(c) for c in s]
+	except ValueError:
+		raise AlphabetError()
 	except (TypeError, IndexError):
-		raise ValueError
+		raise DeobfuscateError()
+
+
+def make_reverse_table(alphabet):
+	'''Return a table mapping the characters of alphabet to their indexes.
+
+	If every character of alphabet is in latin-1, the table is a bytes object
+	to be used with bytes.translate. Otherwise it is a dict.
+	'''
+	if len(alphabet) < 255 and all(ord(c) < 256 for c in alphabet):
+		table = bytearray(b'\xff' * 256)
+		for index, c in enumerate(alphabet):
+			table[ord(c)] = index
+		return bytes(table)
+	return dict((c, index) for index, c in enumerate(alphabet))
+
+
+def decode_reverse(s, reverse_table):
+	'''Decode a string s using a table from make_reverse_table returning a list of ints.'''
+	if isinstance(reverse_table, bytes):
+		try:
+			decoded = s.encode('latin-1').translate(reverse_table)
+		except AttributeError:
+			raise DeobfuscateError()
+		except UnicodeEncodeError:
+			raise AlphabetError()
+		if b'\xff' in decoded:
+			raise AlphabetError()
+		return list(decoded)
+	try:
+		return [reverse_table[c] for c in s]
+	except KeyError:
+		raise AlphabetError()
+	except TypeError:
+		raise DeobfuscateError()
 
 
 def encrypt(int_list, key, base):
+	return encrypt_key_values(int_list, key_gen(key, base), base)
+
+
+def encrypt_key_values(int_list, key_values, base):
+	'''Encrypt int_list using key_values, an iterable of values from key_gen.'''
 	encrypted_ints = []
 	moving_value = 0
-	for char_index, key_value in zip(int_list, key_gen(key, base)):
+	for char_index, key_value in zip(int_list, key_values):
 		encrypted_int = (char_index + key_value + moving_value) % base
 		encrypted_ints.append(encrypted_int)
 		moving_value += encrypted_int
@@ -119,9 +206,14 @@ def encrypt(int_list, key, base):
 
 
 def decrypt(int_list, key, base):
+	return decrypt_key_values(int_list, key_gen(key, base), base)
+
+
+def decrypt_key_values(int_list, key_values, base):
+	'''Decrypt int_list using key_values, an iterable of values from key_gen.'''
 	decrypted_ints = []
 	moving_value = 0
-	for char_index, key_value in zip(int_list, key_gen(key, base)):
+	for char_index, key_value in zip(int_list, key_values):
 		decrypted_int = (char_index - key_value - moving_value) % base
 		decrypted_ints.append(decrypted_int)
 		moving_value += char_index
@@ -171,7 +263,9 @@ def deobfuscate(s, key, alphabet, num_check_chars=1):
 	Returns:
 		The deobfuscated integer.
 	Raises:
-		ValueError: if s isn't a string, s doesn't use alphabet or the checksum doesn't match
+		DeobfuscateError: if s isn't a string
+		AlphabetError: if s doesn't use alphabet
+		ChecksumError: if the checksum doesn't match
 	'''
 	base = len(alphabet)
 	encrypted_ints = decode(s, alphabet)
@@ -180,9 +274,120 @@ def deobfuscate(s, key, alphabet, num_check_chars=1):
 	return decode_base_n(num_as_ints, base)
 
 
+def chunked(iterable, size):
+	'''Yield lists of the next size items of iterable until it is exhausted.'''
+	if not isinstance(size, int) or size < 1:
+		raise ValueError('size must be an int >= 1')
+	iterator = iter(iterable)
+	chunk = list(islice(iterator, size))
+	while chunk:
+		yield chunk
+		chunk = list(islice(iterator, size))
+
+
+def _numpy():
+	'''Return the numpy module if it is installed, otherwise None.'''
+	try:
+		import numpy
+	except ImportError:
+		return None
+	return numpy
+
+
+class Keystream():
+	'''The values of key_gen(key, base), generated once and kept.
+
+	The prefix is only ever extended, so the values returned for a given length
+	are always identical to the first length values of key_gen(key, base).
+	Only the first max_cached values are kept, longer sequences are generated
+	again each time they are asked for.
+
+	The values and the state of the generator are replaced together by a new,
+	longer, immutable pair rather than modified, so this is safe to share
+	between threads without a lock. Threads that extend it at the same time
+	compute identical values.
+	'''
+
+	__slots__ = ('base', 'max_cached', '_state')
+
+	def __init__(self, key, base, max_cached=sys.maxsize):
+		self.base = base
+		self.max_cached = max_cached
+		self._state = (self._pack([]), Random(key).getstate())
+
+	def _pack(self, values):
+		# Bytes can be passed to the C speedups as is
+		if self.base <= 256:
+			return bytes(values)
+		return tuple(values)
+
+	def _generate(self, random_state, count):
+		'''Return count more values after random_state and the state after them.'''
+		random = Random(0)
+		random.setstate(random_state)
+		values = [random.randint(0, self.base - 1) for _ in range(count)]
+		return values, random.getstate()
+
+	def get(self, length):
+		'''Return a sequence of at least length key values.'''
+		max_cached = self.max_cached
+		if length > max_cached:
+			self.get(max_cached)
+			values, random_state = self._state
+			tail, _ = self._generate(random_state, length - len(values))
+			return values + self._pack(tail)
+		values, random_state = self._state
+		if length > len(values):
+			# Grow at least twice as long to rarely repeat this
+			new_length = min(max(length, 2 * len(values), 16), max_cached)
+			new_values, random_state = self._generate(random_state, new_length - len(values))
+			values = values + self._pack(new_values)
+			self._state = (values, random_state)
+		return values
+
+
+# The Obfuscator slots that aren't pickled, they are created again instead
+_UNPICKLED = frozenset(('_speedups', 'token', '_cache', '_reverse_cache', '_negative_cache'))
+
+
 class Obfuscator():
 
-	def __init__(self, key, alphabet=None, min_length=0, num_check_chars=1, version=1):
+	__slots__ = (
+		'num_check_chars',
+		'min_length',
+		'max_length',
+		'_max_length',
+		'alphabet',
+		'_reverse_table',
+		'_base',
+		'_checksum_base',
+		'_digits_per_bit',
+		'_speedups',
+		'_speedups_checksum_base',
+		'keystream_cache_size',
+		'cache_size',
+		'negative_cache_size',
+		'key',
+		'token',
+		'_keystreams',
+		'_salted',
+		'_cache',
+		'_reverse_cache',
+		'_negative_cache',
+		)
+
+	def __init__(
+			self,
+			key,
+			alphabet=None,
+			min_length=0,
+			num_check_chars=1,
+			version=1,
+			keystream_cache_size=128,
+			max_length=None,
+			cache_size=0,
+			negative_cache_size=0,
+			):
 		'''
 
 		This accepts a version number in case the algorithm changes at some point
@@ -190,11 +395,23 @@ class Obfuscator():
 
 		Args:
 			key: The key.
-			alphabet: Optionally, specify an alternative alphabet to use.
+			alphabet: Optionally, specify an alternative alphabet to use, of at
+				least 2 distinct characters.
 			min_length: An encoded value will always be at least min_length
 				characters (including the check characters)
 			num_check_chars: The number of chars used for the check
 			version: The version of the algorithm to use.
+			keystream_cache_size: The maximum number of salts to keep the
+				generated key values and the for_salt obfuscators for.
+			max_length: Optionally, the maximum length of an encoded value
+				(including the check characters). Longer strings are rejected
+				by deobfuscate before decoding them and obfuscate refuses to
+				produce them.
+			cache_size: If > 0, remember up to this many recent results of
+				obfuscate and of deobfuscate per thread. Obfuscating also fills
+				the deobfuscate cache.
+			negative_cache_size: If > 0, remember up to this many recent
+				strings that deobfuscate rejected per thread.
 		'''
 		if isinstance(num_check_chars, int) and num_check_chars >= 0:
 			self.num_check_chars = num_check_chars
@@ -204,23 +421,540 @@ class Obfuscator():
 			self.min_length = min_length - num_check_chars
 		else:
 			raise ValueError('min_length must be an int >= 0')
-		self.key = key
+		if max_length is None:
+			self._max_length = sys.maxsize
+		elif isinstance(max_length, int) and max(min_length, num_check_chars, 1) <= max_length:
+			self._max_length = max_length
+		else:
+			raise ValueError('max_length must be None or an int >= min_length, num_check_chars and 1')
+		self.max_length = max_length
 		alphabet = list(alphabet or ALPHANUM)
+		if not all(isinstance(c, str) and len(c) == 1 for c in alphabet):
+			raise ValueError('alphabet must consist of single characters')
 		shuffle(key, alphabet)
-		self.alphabet = setlist(alphabet)
+		# Drop any repeated characters, keeping the first
+		self.alphabet = ''.join(dict.fromkeys(alphabet))
+		if len(self.alphabet) < 2:
+			raise ValueError('alphabet must have at least 2 distinct characters')
+		self._reverse_table = make_reverse_table(self.alphabet)
+		self._base = len(self.alphabet)
+		self._checksum_base = self._base ** num_check_chars
+		self._digits_per_bit = 1 / math.log(self._base, 2)
+		# The C speedups need a bytes reverse table and 64 bit checksums
+		if _speedups is not None and isinstance(self._reverse_table, bytes):
+			self._speedups = _speedups
+			self._speedups_checksum_base = self._checksum_base if self._checksum_base < 2 ** 64 else 0
+		else:
+			self._speedups = None
+			self._speedups_checksum_base = None
+		self.keystream_cache_size = keystream_cache_size
+		self.cache_size = cache_size
+		self.negative_cache_size = negative_cache_size
+		self._init_key(key)
+
+	def _init_key(self, key):
+		'''Set key and the state that depends on it, other than the alphabet.'''
+		self.key = key
+		# Identifies this instance for values computed with it, a copy gets a new one
+		self.token = object()
+		self._keystreams = {}
+		self._salted = {}
+		if self.cache_size:
+			self._cache = ThreadLocalLRUCache(self.cache_size)
+			self._reverse_cache = ThreadLocalLRUCache(self.cache_size)
+		else:
+			self._cache = None
+			self._reverse_cache = None
+		if self.negative_cache_size:
+			self._negative_cache = ThreadLocalLRUCache(self.negative_cache_size)
+		else:
+			self._negative_cache = None
 
-	def obfuscate(self, num, salt=None, min_length=None):
+	def __getstate__(self):
+		'''Return the state to pickle, everything but the caches.
+
+		The generated key values and salted obfuscators are kept, so an
+		unpickled copy doesn't have to generate them again.
+		'''
+		state = dict((name, getattr(self, name)) for name in self.__slots__ if name not in _UNPICKLED)
+		state['_speedups'] = self._speedups is not None
+		# Tables from use_table are memory mapped files
+		state['_salted'] = dict(
+			(salt, salted) for salt, salted in self._salted.items() if isinstance(salted, Obfuscator))
+		return state
+
+	def __setstate__(self, state):
+		state = dict(state)
+		if state.pop('_speedups') and _speedups is not None:
+			self._speedups = _speedups
+		else:
+			self._speedups = None
+		for name, value in state.items():
+			setattr(self, name, value)
+		key_values = (self._keystreams, self._salted)
+		self._init_key(self.key)
+		self._keystreams, self._salted = key_values
+
+	def for_salt(self, salt):
+		'''Return an Obfuscator that obfuscates like this one does with salt.
+
+		o.for_salt(salt).obfuscate(num) == o.obfuscate(num, salt=salt), without
+		the salt handling on every call. The results for the last
+		keystream_cache_size salts are kept, so calling this again with one
+		of them returns the same instance. Tables from use_table are always
+		kept.
+		'''
+		if not salt:
+			return self
+		try:
+			return self._salted[salt]
+		except KeyError:
+			pass
+		salted = object.__new__(type(self))
+		for name in self.__slots__:
+			setattr(salted, name, getattr(self, name))
+		salted._init_key(self.key + salt)
+		# Share the key values with this obfuscator
+		salted._keystreams = {None: self._keystream(salt)}
+		if self.keystream_cache_size > 0:
+			# Replace rather than modify, see _keystream
+			salted_by_salt = dict(self._salted)
+			oldest = [
+				old_salt for old_salt, old_salted in salted_by_salt.items()
+				if isinstance(old_salted, Obfuscator)
+				]
+			for old_salt in oldest[:len(oldest) - self.keystream_cache_size + 1]:
+				del salted_by_salt[old_salt]
+			salted_by_salt[salt] = salted
+			self._salted = salted_by_salt
+		return salted
+
+	def use_table(self, table):
+		'''Make for_salt(table.salt) return table, a table.PublicIDTable.
+
+		Everything that uses the salted obfuscator, like ModelMixin, then
+		looks ids up in the table.
+		'''
+		if not table.salt:
+			raise ValueError('Only tables with a salt can be used by for_salt')
+		salted = self.for_salt(table.salt)
+		replaced = None
+		if not isinstance(salted, Obfuscator):
+			replaced = salted
+			salted = salted.obfuscator
+		if table.obfuscator is not salted:
+			raise ValueError('The table was built for a different obfuscator')
+		salted_by_salt = dict(self._salted)
+		salted_by_salt[table.salt] = table
+		self._salted = salted_by_salt
+		if replaced is not None and replaced is not table:
+			replaced.close()
+
+	def close(self):
+		'''Close the tables from use_table.
+
+		They keep working after this, computing the public ids instead of
+		looking them up, so it is safe to close them while other threads
+		might still be using this obfuscator.
+		'''
+		for salted in self._salted.values():
+			if not isinstance(salted, Obfuscator):
+				salted.close()
+
+	def _keystream(self, salt):
+		'''Return the Keystream for salt, creating it if necessary.
+
+		The dict of keystreams is never modified, a new one replaces it, so
+		other threads can keep reading the old one without a lock. Two threads
+		adding a salt at the same time may lose one of them, which then just
+		gets created again.
+		'''
+		try:
+			return self._keystreams[salt]
+		except KeyError:
+			pass
 		if salt:
 			key = self.key + salt
 		else:
 			key = self.key
+		# Enough for any 64 bit id and any id up to max_length, so that long
+		# strings passed to deobfuscate don't make it grow
+		max_cached = max(max(64, self.min_length) + self.num_check_chars, self.max_length or 0)
+		keystream = Keystream(key, len(self.alphabet), max_cached)
+		if self.keystream_cache_size > 0:
+			keystreams = dict(self._keystreams)
+			while len(keystreams) >= self.keystream_cache_size:
+				# Evict the oldest entry
+				del keystreams[next(iter(keystreams))]
+			keystreams[salt] = keystream
+			self._keystreams = keystreams
+		return keystream
+
+	def _obfuscate(self, num, keystream, min_length):
+		'''Obfuscate num in a single pass, see obfuscate for the reference.'''
+		num_check_chars = self.num_check_chars
+		if self._speedups is not None:
+			try:
+				out = self._speedups.obfuscate(
+					num,
+					keystream.get(max(64, min_length) + num_check_chars),
+					self.alphabet,
+					min_length,
+					num_check_chars,
+					self._speedups_checksum_base,
+					)
+			except (TypeError, OverflowError):
+				# Not an int or doesn't fit in 64 bits
+				pass
+			else:
+				if len(out) > self._max_length:
+					raise ValueError()
+				return out
+		try:
+			num = operator.index(num)
+			if num < 0:
+				raise ValueError()
+		except TypeError:
+			raise ValueError()
+		# An upper bound on the number of digits
+		length = int(num.bit_length() * self._digits_per_bit) + 1
+		key_values = keystream.get(max(length, min_length) + num_check_chars)
+		base = self._base
+		chars = self.alphabet
+		out = []
+		checksum = 0
+		moving_value = 0
+		index = 0
+		while num > 0 or index < min_length:
+			num, digit = divmod(num, base)
+			checksum += digit
+			encrypted = (digit + key_values[index] + moving_value) % base
+			out.append(chars[encrypted])
+			moving_value += encrypted
+			index += 1
+		if num_check_chars:
+			checksum %= self._checksum_base
+			for index in range(index, index + num_check_chars):
+				checksum, digit = divmod(checksum, base)
+				encrypted = (digit + key_values[index] + moving_value) % base
+				out.append(chars[encrypted])
+				moving_value += encrypted
+		if len(out) > self._max_length:
+			raise ValueError()
+		return ''.join(out)
+
+	def _deobfuscate(self, s, keystream):
+		'''Deobfuscate s in a single pass, see deobfuscate for the reference.'''
+		try:
+			if len(s) > self._max_length:
+				raise TooLongError()
+		except TypeError:
+			raise DeobfuscateError()
+		num_check_chars = self.num_check_chars
+		if self._speedups is not None:
+			if len(s) > keystream.max_cached:
+				# Reject characters outside the alphabet before generating key
+				# values for a string this long, they aren't kept
+				decode_reverse(s, self._reverse_table)
+			try:
+				num = self._speedups.deobfuscate(
+					s,
+					keystream.get(len(s)),
+					self._reverse_table,
+					self._base,
+					num_check_chars,
+					self._speedups_checksum_base,
+					)
+			except TypeError:
+				raise DeobfuscateError()
+			# None if it doesn't fit in 64 bits
+			if num is not None:
+				return num
+		ints = decode_reverse(s, self._reverse_table)
+		num_length = len(ints) - num_check_chars
+		if num_length < 0:
+			raise ChecksumError()
+		key_values = keystream.get(len(ints))
+		base = self._base
+		# Decrypt in place
+		moving_value = 0
+		for index in range(len(ints)):
+			encrypted = ints[index]
+			ints[index] = (encrypted - key_values[index] - moving_value) % base
+			moving_value += encrypted
+		num = 0
+		checksum = 0
+		for index in range(num_length - 1, -1, -1):
+			digit = ints[index]
+			num = num * base + digit
+			checksum += digit
+		if num_check_chars:
+			checksum %= self._checksum_base
+			for index in range(num_length, num_length + num_check_chars):
+				checksum, digit = divmod(checksum, base)
+				if ints[index] != digit:
+					raise ChecksumError()
+		return num
+
+	def _obfuscate_cached(self, num, salt):
+		key = (num, salt)
+		s = self._cache.get(key)
+		if s is None:
+			s = self._obfuscate(num, self._keystream(salt), self.min_length)
+			self._cache.set(key, s)
+			self._reverse_cache.set((s, salt), num)
+		return s
+
+	def _deobfuscate_cached(self, s, salt):
+		# Reject huge strings before hashing them, and don't let them fill the caches
+		if len(s) > self._max_length:
+			raise TooLongError()
+		key = (s, salt)
+		if self._reverse_cache is not None:
+			num = self._reverse_cache.get(key)
+			if num is not None:
+				return num
+		if self._negative_cache is not None:
+			error = self._negative_cache.get(key)
+			if error is not None:
+				raise error()
+		try:
+			num = self._deobfuscate(s, self._keystream(salt))
+		except ValueError as e:
+			if self._negative_cache is not None:
+				self._negative_cache.set(key, type(e))
+			raise
+		if self._reverse_cache is not None:
+			self._reverse_cache.set(key, num)
+		return num
+
+	def obfuscate(self, num, salt=None, min_length=None):
 		if min_length is None:
+			# Only cache exact ints, 1.0 == 1 but it isn't a valid id
+			if self._cache is not None and num.__class__ is int:
+				return self._obfuscate_cached(num, salt)
 			min_length = self.min_length
-		return obfuscate(num, key, self.alphabet, min_length, self.num_check_chars)
+		return self._obfuscate(num, self._keystream(salt), min_length)
 
 	def deobfuscate(self, s, salt=None):
-		if salt:
-			key = self.key + salt
+		if s.__class__ is str and (self._reverse_cache is not None or self._negative_cache is not None):
+			return self._deobfuscate_cached(s, salt)
+		return self._deobfuscate(s, self._keystream(salt))
+
+	def cache_info(self):
+		'''Return the CacheInfo of the enabled obfuscate, deobfuscate and negative caches.'''
+		caches = (
+			('obfuscate', self._cache),
+			('deobfuscate', self._reverse_cache),
+			('negative', self._negative_cache),
+			)
+		return dict((name, cache.info()) for name, cache in caches if cache is not None)
+
+	def obfuscate_many(self, nums, salt=None, min_length=None, parallel=None):
+		'''Obfuscate each of nums, returning a list of strings.
+
+		This is equivalent to calling obfuscate for each num but only does the
+		setup once. See obfuscate_stream for parallel.
+
+		Raises:
+			ValueError: if any of nums is not a number or < 0
+		'''
+		if parallel:
+			return list(self.obfuscate_stream(nums, salt=salt, min_length=min_length, parallel=parallel))
+		if min_length is None:
+			if self._cache is not None:
+				return [self.obfuscate(num, salt) for num in nums]
+			min_length = self.min_length
+		keystream = self._keystream(salt)
+		return [self._obfuscate(num, keystream, min_length) for num in nums]
+
+	def obfuscate_array(self, nums, salt=None, min_length=None):
+		'''Obfuscate a NumPy array of integers, returning an array of strings.
+
+		This requires numpy, see flask_obfuscateids.vectorized.
+		'''
+		from . import vectorized
+		if min_length is None:
+			min_length = self.min_length
+		return vectorized._obfuscate(
+			nums,
+			self._keystream(salt),
+			self.alphabet,
+			min_length,
+			self.num_check_chars,
+			self.max_length,
+			)
+
+	def deobfuscate_array(self, strings, salt=None, errors='raise'):
+		'''Deobfuscate a NumPy array of strings, returning an int64 array.
+
+		This requires numpy, see flask_obfuscateids.vectorized.
+		'''
+		from . import vectorized
+		return vectorized._deobfuscate(
+			strings,
+			self._keystream(salt),
+			self.alphabet,
+			self.num_check_chars,
+			errors,
+			self.max_length,
+			)
+
+	def deobfuscate_many(self, strings, salt=None, errors='raise', parallel=None):
+		'''Deobfuscate each of strings, returning a list of integers.
+
+		Args:
+			strings: An iterable of strings to deobfuscate
+			salt: The salt used to obfuscate the strings
+			errors: What to do with invalid strings. If 'raise', the first one
+				raises a ValueError. If 'none', None is returned in its place.
+			parallel: See obfuscate_stream
+		Raises:
+			ValueError: if errors is 'raise' and any of strings is invalid
+		'''
+		if errors not in ('raise', 'none'):
+			raise ValueError("errors must be 'raise' or 'none'")
+		if parallel:
+			return list(self.deobfuscate_stream(strings, salt=salt, errors=errors, parallel=parallel))
+		if self._reverse_cache is None and self._negative_cache is None:
+			deobfuscate = partial(self._deobfuscate, keystream=self._keystream(salt))
 		else:
-			key = self.key
-		return deobfuscate(s, key, self.alphabet, self.num_check_chars)
+			deobfuscate = partial(self.deobfuscate, salt=salt)
+		if errors == 'raise':
+			return [deobfuscate(s) for s in strings]
+		out = []
+		for s in strings:
+			try:
+				out.append(deobfuscate(s))
+			except ValueError:
+				out.append(None)
+		return out
+
+	def obfuscate_stream(
+			self,
+			nums,
+			salt=None,
+			min_length=None,
+			chunk_size=STREAM_CHUNK_SIZE,
+			parallel=None,
+			):
+		'''Obfuscate an iterable of integers, yielding the strings in order.
+
+		nums is read chunk_size at a time, so memory use doesn't grow with its
+		length. If numpy is installed, each chunk is obfuscated with
+		flask_obfuscateids.vectorized, otherwise with obfuscate_many. The
+		results are the same either way.
+
+		Args:
+			parallel: If True or a number of processes, obfuscate the chunks in
+				a pool of that many worker processes, default os.cpu_count().
+				This is worth it for millions of ids. The results are the same,
+				in the same order.
+		Raises:
+			ValueError: if any of nums is not a number or < 0, after the
+				strings of the chunks before it have been yielded
+		'''
+		return self._map_chunks('_obfuscate_chunk', chunked(nums, chunk_size), (salt, min_length), parallel)
+
+	def deobfuscate_stream(
+			self,
+			strings,
+			salt=None,
+			errors='raise',
+			chunk_size=STREAM_CHUNK_SIZE,
+			parallel=None,
+			):
+		'''Deobfuscate an iterable of strings, yielding the integers in order.
+
+		This is the counterpart of obfuscate_stream, see deobfuscate_many for
+		errors.
+		'''
+		if errors not in ('raise', 'none'):
+			raise ValueError("errors must be 'raise' or 'none'")
+		return self._map_chunks('_deobfuscate_chunk', chunked(strings, chunk_size), (salt, errors), parallel)
+
+	def _map_chunks(self, method, chunks, args, parallel):
+		'''Return an iterator of the items of the results of method(chunk, *args) for each of chunks.'''
+		if not parallel:
+			return (item for chunk in chunks for item in getattr(self, method)(chunk, *args))
+		if parallel is True:
+			workers = os.cpu_count() or 1
+		elif isinstance(parallel, int) and parallel >= 1:
+			workers = parallel
+		else:
+			raise ValueError('parallel must be None, a bool or an int >= 1')
+		return _parallel_map(self, method, chunks, args, workers)
+
+	def _obfuscate_chunk(self, nums, salt, min_length):
+		np = _numpy()
+		if np is not None and len(nums) >= MIN_VECTORIZED_CHUNK_SIZE:
+			try:
+				return self.obfuscate_array(np.array(nums), salt=salt, min_length=min_length).tolist()
+			except (ValueError, TypeError, OverflowError):
+				# Not all ints that fit in 64 bits, obfuscate_many handles them
+				pass
+		return self.obfuscate_many(nums, salt=salt, min_length=min_length)
+
+	def _deobfuscate_chunk(self, strings, salt, errors):
+		np = _numpy()
+		if np is not None and len(strings) >= MIN_VECTORIZED_CHUNK_SIZE:
+			nums = self._deobfuscate_vectorized(np, strings, salt, errors)
+			if nums is not None:
+				return nums
+		return self.deobfuscate_many(strings, salt=salt, errors=errors)
+
+	def _deobfuscate_vectorized(self, np, strings, salt, errors):
+		'''Return deobfuscate_many(strings) using NumPy, or None if it can't be used.'''
+		# NumPy would turn other types into strings
+		if not all(s.__class__ is str for s in strings):
+			return None
+		array = np.array(strings)
+		# NumPy strips trailing NULs, which would make invalid strings valid
+		if int(np.char.str_len(array).sum()) != sum(map(len, strings)):
+			return None
+		masked = self.deobfuscate_array(array, salt=salt, errors='mask')
+		invalid = np.ma.getmaskarray(masked)
+		nums = masked.data.tolist()
+		if invalid.any():
+			# Invalid or too big for an int64, let the Python implementation decide
+			if errors == 'raise':
+				return None
+			for index in np.flatnonzero(invalid).tolist():
+				nums[index] = self.deobfuscate_many([strings[index]], salt=salt, errors=errors)[0]
+		return nums
+
+
+# The Obfuscator of a worker process of _parallel_map
+_worker_obfuscator = None
+
+
+def _init_worker(obfuscator):
+	global _worker_obfuscator
+	_worker_obfuscator = obfuscator
+
+
+def _call_worker(method, chunk, args):
+	return getattr(_worker_obfuscator, method)(chunk, *args)
+
+
+def _parallel_map(obfuscator, method, chunks, args, workers):
+	'''Yield the items of obfuscator.method(chunk, *args) for each of chunks, in order.
+
+	The chunks are handled by a pool of worker processes. obfuscator is sent
+	to each worker once, when it starts, and only up to two chunks per worker
+	are in flight at a time so that memory use stays bounded.
+	'''
+	from concurrent.futures import ProcessPoolExecutor
+	executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(obfuscator, ))
+	pending = deque()
+	try:
+		for chunk in chunks:
+			pending.append(executor.submit(_call_worker, method, chunk, args))
+			if len(pending) >= 2 * workers:
+				yield from pending.popleft().result()
+		while pending:
+			yield from pending.popleft().result()
+	finally:
+		for future in pending:
+			future.cancel()
+		executor.shutdown()
@@ -0,0 +1,222 @@
+'''Counts, failure reasons and latencies of obfuscate and deobfuscate calls.
+
+ObfuscateIDs records a Metrics for each app context when
+OBFUSCATE_IDS_METRICS is set, by handing out an InstrumentedObfuscator in
+place of the shared Obfuscator.
+'''
+import bisect
+from collections import deque
+from time import perf_counter
+
+from .lib import STREAM_CHUNK_SIZE
+
+# The upper bounds in seconds of the latency histogram buckets
+BUCKETS = (1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 1e-3, float('inf'))
+
+OPERATIONS = ('obfuscate', 'deobfuscate')
+
+
+class Metrics():
+	'''The metrics of one app context, usually one request.
+
+	Attributes:
+		counts: The number of ids passed to obfuscate and deobfuscate by operation
+		failures: The number of strings that couldn't be deobfuscated by
+			reason, see lib.DeobfuscateError.reason
+		latencies: The duration in seconds of each call by operation. Calls
+			of the _many and _stream methods are timed as a whole, streams
+			excluding the time spent by the caller between items.
+	'''
+
+	def __init__(self):
+		self.counts = dict.fromkeys(OPERATIONS, 0)
+		self.failures = {}
+		self.latencies = dict((operation, []) for operation in OPERATIONS)
+
+	def __bool__(self):
+		return any(self.latencies.values())
+
+	def record(self, operation, seconds, count=1):
+		self.counts[operation] += count
+		self.latencies[operation].append(seconds)
+
+	def record_failure(self, reason):
+		self.failures[reason] = self.failures.get(reason, 0) + 1
+
+	def histogram(self, operation, buckets=BUCKETS):
+		'''Return the number of calls of operation that took at most each of buckets.
+
+		Like Prometheus histograms, the counts are cumulative.
+		'''
+		counts = [0] * len(buckets)
+		for seconds in self.latencies[operation]:
+			index = bisect.bisect_left(buckets, seconds)
+			if index < len(buckets):
+				counts[index] += 1
+		for index in range(1, len(counts)):
+			counts[index] += counts[index - 1]
+		return list(zip(buckets, counts))
+
+	def as_dict(self, buckets=BUCKETS):
+		'''Return the metrics as a dict of plain values, e.g. to log as JSON.'''
+		return {
+			'counts': dict(self.counts),
+			'failures': dict(self.failures),
+			'latency': dict(
+				(operation, {
+					'count': len(self.latencies[operation]),
+					'sum': sum(self.latencies[operation]),
+					'buckets': self.histogram(operation, buckets),
+					})
+				for operation in OPERATIONS
+				),
+			}
+
+
+class InstrumentedObfuscator():
+	'''An Obfuscator that records its calls in a Metrics.
+
+	obfuscate, deobfuscate and the _many and _stream methods are timed,
+	everything else is passed through to the wrapped obfuscator.
+	'''
+	__slots__ = ('obfuscator', 'metrics')
+
+	def __init__(self, obfuscator, metrics):
+		self.obfuscator = obfuscator
+		self.metrics = metrics
+
+	def __getattr__(self, name):
+		return getattr(self.obfuscator, name)
+
+	def for_salt(self, salt):
+		return InstrumentedObfuscator(self.obfuscator.for_salt(salt), self.metrics)
+
+	def obfuscate(self, num, salt=None, min_length=None):
+		start = perf_counter()
+		try:
+			return self.obfuscator.obfuscate(num, salt=salt, min_length=min_length)
+		finally:
+			self.metrics.record('obfuscate', perf_counter() - start)
+
+	def deobfuscate(self, s, salt=None):
+		start = perf_counter()
+		try:
+			return self.obfuscator.deobfuscate(s, salt=salt)
+		except ValueError as e:
+			self.metrics.record_failure(getattr(e, 'reason', 'invalid'))
+			raise
+		finally:
+			self.metrics.record('deobfuscate', perf_counter() - start)
+
+	def obfuscate_many(self, nums, salt=None, min_length=None, parallel=None):
+		start = perf_counter()
+		out = []
+		try:
+			out = self.obfuscator.obfuscate_many(nums, salt=salt, min_length=min_length, parallel=parallel)
+			return out
+		finally:
+			self.metrics.record('obfuscate', perf_counter() - start, len(out))
+
+	def deobfuscate_many(self, strings, salt=None, errors='raise', parallel=None):
+		if errors not in ('raise', 'none'):
+			raise ValueError("errors must be 'raise' or 'none'")
+		if parallel:
+			return list(self.deobfuscate_stream(strings, salt=salt, errors=errors, parallel=parallel))
+		# One at a time to record the reason of each failure
+		deobfuscate = self.obfuscator.deobfuscate
+		start = perf_counter()
+		out = []
+		try:
+			for s in strings:
+				try:
+					out.append(deobfuscate(s, salt=salt))
+				except ValueError as e:
+					self.metrics.record_failure(getattr(e, 'reason', 'invalid'))
+					if errors == 'raise':
+						raise
+					out.append(None)
+			return out
+		finally:
+			self.metrics.record('deobfuscate', perf_counter() - start, len(out))
+
+	def obfuscate_stream(self, nums, salt=None, min_length=None, chunk_size=STREAM_CHUNK_SIZE, parallel=None):
+		results = self.obfuscator.obfuscate_stream(
+			nums, salt=salt, min_length=min_length, chunk_size=chunk_size, parallel=parallel)
+		return self._record_stream('obfuscate', results)
+
+	def deobfuscate_stream(self, strings, salt=None, errors='raise', chunk_size=STREAM_CHUNK_SIZE, parallel=None):
+		# The strings not yet deobfuscated, to find the reasons of failures
+		pending = deque()
+
+		def remember(strings):
+			for s in strings:
+				pending.append(s)
+				yield s
+
+		results = self.obfuscator.deobfuscate_stream(
+			remember(strings), salt=salt, errors=errors, chunk_size=chunk_size, parallel=parallel)
+		return self._record_stream('deobfuscate', results, pending, salt)
+
+	def _record_stream(self, operation, results, pending=None, salt=None):
+		'''Yield results, recording them as one call once the stream ends.'''
+		count = 0
+		seconds = 0
+		try:
+			while True:
+				start = perf_counter()
+				try:
+					item = next(results)
+				except StopIteration:
+					return
+				except ValueError as e:
+					if pending is not None:
+						self.metrics.record_failure(getattr(e, 'reason', 'invalid'))
+					raise
+				finally:
+					seconds += perf_counter() - start
+				count += 1
+				if pending is not None:
+					s = pending.popleft()
+					if item is None:
+						self._record_failure(s, salt)
+				yield item
+		finally:
+			self.metrics.record(operation, seconds, count)
+
+	def _record_failure(self, s, salt):
+		'''Record the reason that s couldn't be deobfuscated.'''
+		try:
+			self.obfuscator.deobfuscate(s, salt=salt)
+		except ValueError as e:
+			self.metrics.record_failure(getattr(e, 'reason', 'invalid'))
+
+
+def prometheus_sink(calls, failures, latency):
+	'''Return a metrics sink that adds each Metrics to Prometheus style collectors.
+
+	The collectors aren't created here so that prometheus_client isn't a
+	dependency, e.g.::
+
+		from prometheus_client import Counter, Histogram
+		obfuscate_ids.metrics_sink(prometheus_sink(
+			Counter('obfuscate_ids_calls', 'Ids handled', ['operation']),
+			Counter('obfuscate_ids_failures', 'Failed deobfuscations', ['reason']),
+			Histogram('obfuscate_ids_seconds', 'Call latency', ['operation']),
+			))
+
+	Args:
+		calls: A counter with an operation label
+		failures: A counter with a reason label
+		latency: A histogram with an operation label
+	'''
+	def sink(metrics):
+		for operation, count in metrics.counts.items():
+			if count:
+				calls.labels(operation=operation).inc(count)
+		for reason, count in metrics.failures.items():
+			failures.labels(reason=reason).inc(count)
+		for operation, latencies in metrics.latencies.items():
+			histogram = latency.labels(operation=operation)
+			for seconds in latencies:
+				histogram.observe(seconds)
+	return sink
@@ -0,0 +1,150 @@
+'''Rewrite the id columns of CSV and JSON lines files, e.g. for exports.
+
+The rows are read and written a chunk at a time, so files of any size can be
+rewritten in constant memory. Each column of a chunk is converted at once
+with Obfuscator.obfuscate_stream or deobfuscate_stream.
+'''
+import csv
+import json
+
+from .lib import STREAM_CHUNK_SIZE, chunked
+
+
+def _column_salts(columns, salt):
+	'''Return a list of (column, salt) from a list of columns or a dict of their salts.'''
+	if isinstance(columns, dict):
+		return list(columns.items())
+	if isinstance(columns, str):
+		raise TypeError('columns must be a list or dict, not a str')
+	return [(column, salt) for column in columns]
+
+
+def rewrite_rows(
+		rows,
+		obfuscator,
+		columns,
+		salt=None,
+		decode=False,
+		errors='raise',
+		chunk_size=STREAM_CHUNK_SIZE,
+		empty=('', None),
+		):
+	'''Yield rows with the values of columns obfuscated, or deobfuscated.
+
+	The rows are changed in place. Rows that don't have a column, or where its
+	value is in empty, are left as they are.
+
+	Args:
+		rows: An iterable of lists or dicts
+		obfuscator: The Obfuscator to use
+		columns: The indexes or keys of the columns to rewrite, or a dict of
+			them to the salt to use for each
+		salt: The salt to use for columns that are not in a dict
+		decode: If True, deobfuscate public ids instead of obfuscating ids
+		errors: What to do with invalid public ids, see
+			Obfuscator.deobfuscate_many. If 'none', they are replaced by None.
+		chunk_size: The number of rows to handle at a time
+		empty: The values to leave as they are
+	Raises:
+		ValueError: if an id is invalid, or a public id and errors is 'raise'
+	'''
+	column_salts = _column_salts(columns, salt)
+	for chunk in chunked(rows, chunk_size):
+		for column, column_salt in column_salts:
+			present = []
+			values = []
+			for row in chunk:
+				try:
+					value = row[column]
+				except (IndexError, KeyError):
+					continue
+				if value in empty:
+					continue
+				present.append(row)
+				values.append(value)
+			if not values:
+				continue
+			if decode:
+				converted = obfuscator.deobfuscate_stream(
+					values, salt=column_salt, errors=errors, chunk_size=len(values))
+			else:
+				converted = obfuscator.obfuscate_stream(
+					(int(value) if isinstance(value, str) else value for value in values),
+					salt=column_salt,
+					chunk_size=len(values),
+					)
+			for row, value in zip(present, converted):
+				row[column] = value
+		yield from chunk
+
+
+def rewrite_csv(
+		infile,
+		outfile,
+		obfuscator,
+		columns,
+		salt=None,
+		decode=False,
+		errors='raise',
+		chunk_size=STREAM_CHUNK_SIZE,
+		**fmtparams
+		):
+	'''Copy a CSV file with a header row, rewriting the named columns.
+
+	The files should be opened with newline=''. Invalid public ids are
+	written as empty values if errors is 'none'. See rewrite_rows for the
+	other arguments, fmtparams are passed to csv.reader and csv.writer.
+
+	Raises:
+		ValueError: if any of columns isn't in the header, or see rewrite_rows
+	'''
+	reader = csv.reader(infile, **fmtparams)
+	writer = csv.writer(outfile, **fmtparams)
+	try:
+		header = next(reader)
+	except StopIteration:
+		return
+	column_indexes = {}
+	for column, column_salt in _column_salts(columns, salt):
+		try:
+			column_indexes[header.index(column)] = column_salt
+		except ValueError:
+			raise ValueError('No column %r in the header' % (column, ))
+	writer.writerow(header)
+	rows = rewrite_rows(
+		reader,
+		obfuscator,
+		column_indexes,
+		decode=decode,
+		errors=errors,
+		chunk_size=chunk_size,
+		)
+	writer.writerows(['' if value is None else value for value in row] for row in rows)
+
+
+def rewrite_jsonl(
+		infile,
+		outfile,
+		obfuscator,
+		columns,
+		salt=None,
+		decode=False,
+		errors='raise',
+		chunk_size=STREAM_CHUNK_SIZE,
+		):
+	'''Copy a JSON lines file of objects, rewriting the values of the keys columns.
+
+	Blank lines are skipped. Invalid public ids are written as null if errors
+	is 'none'. See rewrite_rows for the other arguments.
+	'''
+	objs = (json.loads(line) for line in infile if line.strip())
+	rows = rewrite_rows(
+		objs,
+		obfuscator,
+		columns,
+		salt=salt,
+		decode=decode,
+		errors=errors,
+		chunk_size=chunk_size,
+		)
+	outfile.writelines(json.dumps(obj) + '\n' for obj in rows)
@@ -0,0 +1,365 @@
+'''Precomputed public ids of a range of ids, memory mapped from a file.
+
+build_table writes the public ids of range(start, stop) for one salt to a
+file of fixed width records, optionally followed by a reverse index of the
+records sorted by public id. PublicIDTable memory maps the file, so looking
+up an id in the range is a slice of the map, shared by every process on the
+machine through the page cache. Everything else falls back to the Obfuscator.
+
+The alphabet has to be latin-1, one byte per character. Records shorter
+than the longest are padded with NUL bytes, so set min_length high enough
+for all of the ids in the range to avoid wasting space.
+
+File layout, all integers little-endian:
+	header: magic, format version, width, start, count, forward offset,
+		reverse offset and directory offset (0 if there is no reverse
+		index), prefix length
+	forward: count records of width bytes, the public id of start + index
+	reverse: count records of width bytes and the index as an unsigned 64
+		bit int, sorted by the public id bytes
+	directory: for each prefix of prefix length characters in sorted order,
+		the index of the first reverse record with that prefix or a later
+		one, then count, as unsigned 64 bit ints. Public ids are uniformly
+		distributed, so a lookup only has to search a few records.
+'''
+import mmap
+import os
+import struct
+
+from .lib import STREAM_CHUNK_SIZE, chunked
+
+MAGIC = b'OBFIDTBL'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<8sIIQQQQQQ')
+_INDEX = struct.Struct('<Q')
+_BOUNDS = struct.Struct('<QQ')
+# Keep the directory to a few MB
+MAX_DIRECTORY_SIZE = 2 ** 20
+
+
+def _encode(s, width):
+	return s.encode('latin-1').ljust(width, b'\0')
+
+
+def _prefix_ranks(alphabet):
+	'''Return a translate table of bytes to their rank in the sorted alphabet, NUL and others to 0.'''
+	ranks = bytearray(256)
+	for rank, byte in enumerate(sorted(alphabet.encode('latin-1')), 1):
+		ranks[byte] = rank
+	return bytes(ranks)
+
+
+def _prefix_length(base, count, width):
+	'''Return the number of leading characters to index by.'''
+	length = 0
+	while length < width and base ** (length + 1) <= min(count, MAX_DIRECTORY_SIZE):
+		length += 1
+	return length
+
+
+def _bucket(key, ranks, base, prefix_length):
+	bucket = 0
+	for rank in key[:prefix_length].translate(ranks):
+		bucket = bucket * base + rank
+	return bucket
+
+
+def build_table(path, obfuscator, start, stop, salt=None, reverse=False, chunk_size=STREAM_CHUNK_SIZE):
+	'''Write the public ids of range(start, stop) with salt to a table file at path.
+
+	The file is written next to path and then moved into place, so a
+	PublicIDTable never sees a partial file.
+
+	Args:
+		path: The path of the file to write
+		obfuscator: The Obfuscator to use, as configured for the app
+		start: The first id in the table, >= 0
+		stop: The id after the last one in the table
+		salt: The salt to use, e.g. the class name of a ModelMixin
+		reverse: If True, also write a sorted reverse index for deobfuscate
+		chunk_size: The number of ids to obfuscate at a time
+	Raises:
+		ValueError: if the range is empty or the alphabet isn't latin-1
+	'''
+	if not (isinstance(start, int) and isinstance(stop, int) and 0 <= start < stop):
+		raise ValueError('start and stop must be ints with 0 <= start < stop')
+	if any(ord(c) > 255 for c in obfuscator.alphabet):
+		raise ValueError('The alphabet must be latin-1 to build a table')
+	count = stop - start
+	# Public ids never get shorter as ids grow
+	width = len(obfuscator.obfuscate(stop - 1, salt=salt))
+	forward_offset = _HEADER.size
+	reverse_offset = forward_offset + count * width if reverse else 0
+	directory_offset = reverse_offset + count * (width + _INDEX.size) if reverse else 0
+	prefix_length = _prefix_length(len(obfuscator.alphabet) + 1, count, width) if reverse else 0
+	tmp_path = '%s.%d.tmp' % (path, os.getpid())
+	try:
+		with open(tmp_path, 'w+b') as f:
+			f.write(_HEADER.pack(
+				MAGIC,
+				FORMAT_VERSION,
+				width,
+				start,
+				count,
+				forward_offset,
+				reverse_offset,
+				directory_offset,
+				prefix_length,
+				))
+			public_ids = obfuscator.obfuscate_stream(range(start, stop), salt=salt, chunk_size=chunk_size)
+			for chunk in chunked(public_ids, chunk_size):
+				f.write(b''.join(_encode(s, width) for s in chunk))
+			if reverse:
+				f.flush()
+				ranks = _prefix_ranks(obfuscator.alphabet)
+				base = len(obfuscator.alphabet) + 1
+				_write_reverse_index(f, forward_offset, width, count, chunk_size)
+				f.flush()
+				_write_directory(f, forward_offset, width, count, ranks, base, prefix_length, chunk_size)
+		os.replace(tmp_path, path)
+	except BaseException:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+		raise
+
+
+def _write_reverse_index(f, forward_offset, width, count, chunk_size):
+	'''Append the forward records of f sorted by public id, each with its index.'''
+	with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as forward:
+		try:
+			import numpy as np
+		except ImportError:
+			np = None
+		if np is not None:
+			records = np.frombuffer(forward, dtype='S%d' % width, count=count, offset=forward_offset)
+			order = np.argsort(records, kind='stable')
+			entry = np.dtype([('public_id', 'S%d' % width), ('index', '<u8')])
+			for chunk_start in range(0, count, chunk_size):
+				indexes = order[chunk_start:chunk_start + chunk_size]
+				entries = np.empty(len(indexes), dtype=entry)
+				entries['public_id'] = records[indexes]
+				entries['index'] = indexes
+				f.write(entries.tobytes())
+			del records
+		else:
+			def record(index):
+				offset = forward_offset + index * width
+				return forward[offset:offset + width]
+
+			for index in sorted(range(count), key=record):
+				f.write(record(index) + _INDEX.pack(index))
+
+
+def _write_directory(f, forward_offset, width, count, ranks, base, prefix_length, chunk_size):
+	'''Append the directory of the reverse index, counting the forward records of f by prefix.'''
+	num_buckets = base ** prefix_length
+	with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as forward:
+		try:
+			import numpy as np
+		except ImportError:
+			np = None
+		if np is not None:
+			records = np.frombuffer(forward, dtype=np.uint8, count=count * width, offset=forward_offset)
+			records = records.reshape(count, width)
+			rank_array = np.frombuffer(ranks, dtype=np.uint8).astype(np.int64)
+			counts = np.zeros(num_buckets, dtype=np.int64)
+			for chunk_start in range(0, count, chunk_size):
+				buckets = np.zeros(min(chunk_size, count - chunk_start), dtype=np.int64)
+				for column in range(prefix_length):
+					buckets *= base
+					buckets += rank_array[records[chunk_start:chunk_start + chunk_size, column]]
+				counts += np.bincount(buckets, minlength=num_buckets)
+			del records
+			bounds = np.zeros(num_buckets + 1, dtype='<u8')
+			bounds[1:] = np.cumsum(counts)
+			f.write(bounds.tobytes())
+		else:
+			counts = [0] * num_buckets
+			for index in range(count):
+				offset = forward_offset + index * width
+				counts[_bucket(forward[offset:offset + width], ranks, base, prefix_length)] += 1
+			total = 0
+			f.write(_INDEX.pack(total))
+			for bucket_count in counts:
+				total += bucket_count
+				f.write(_INDEX.pack(total))
+
+
+class PublicIDTable():
+	'''The public ids of a range of ids for one salt, from a file written by build_table.
+
+	This is used like the salted obfuscator, obfuscator.for_salt(salt).
+	obfuscate looks up ids in the range. deobfuscate looks up public ids in
+	the reverse index if there is one and the C speedups aren't available,
+	since they deobfuscate faster than the lookup. Everything else is passed
+	through to the salted obfuscator. See Obfuscator.use_table to have for_salt return
+	this.
+
+	Args:
+		path: The path of the table file
+		obfuscator: The Obfuscator the table was built with
+		salt: The salt the table was built with
+	Raises:
+		ValueError: if the file isn't a table or wasn't built with obfuscator
+			and salt
+	'''
+	__slots__ = (
+		'obfuscator',
+		'salt',
+		'path',
+		'start',
+		'stop',
+		'width',
+		'has_reverse',
+		'_count',
+		'_forward_offset',
+		'_reverse_offset',
+		'_directory_offset',
+		'_prefix_length',
+		'_use_reverse',
+		'_ranks',
+		'_base',
+		'_mmap',
+		)
+
+	def __init__(self, path, obfuscator, salt=None):
+		salted = obfuscator.for_salt(salt)
+		if isinstance(salted, PublicIDTable):
+			# Already using a table for salt, see Obfuscator.use_table
+			salted = salted.obfuscator
+		self.obfuscator = salted
+		self.salt = salt
+		self.path = path
+		with open(path, 'rb') as f:
+			self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			self._read_header()
+		except ValueError:
+			self._mmap.close()
+			raise
+
+	def _read_header(self):
+		path = self.path
+		if len(self._mmap) < _HEADER.size:
+			raise ValueError('%s is not a public id table' % path)
+		(
+			magic,
+			version,
+			width,
+			start,
+			count,
+			forward_offset,
+			reverse_offset,
+			directory_offset,
+			prefix_length,
+			) = _HEADER.unpack_from(self._mmap)
+		if magic != MAGIC:
+			raise ValueError('%s is not a public id table' % path)
+		if version != FORMAT_VERSION:
+			raise ValueError('%s has unknown format version %d' % (path, version))
+		self.width = width
+		self.start = start
+		self.stop = start + count
+		self.has_reverse = bool(reverse_offset)
+		self._count = count
+		self._forward_offset = forward_offset
+		self._reverse_offset = reverse_offset
+		self._directory_offset = directory_offset
+		self._prefix_length = prefix_length
+		self._ranks = _prefix_ranks(self.obfuscator.alphabet)
+		self._base = len(self.obfuscator.alphabet) + 1
+		# Deobfuscating with the C speedups is faster than a lookup
+		self._use_reverse = bool(reverse_offset) and getattr(self.obfuscator, '_speedups', None) is None
+		# Check the first and last records rather than trusting the file
+		for num in (self.start, self.stop - 1):
+			if self.obfuscate(num) != self.obfuscator.obfuscate(num):
+				raise ValueError('%s was built with a different key, salt or configuration' % path)
+
+	def __getattr__(self, name):
+		if name == 'obfuscator':
+			raise AttributeError(name)
+		return getattr(self.obfuscator, name)
+
+	def __len__(self):
+		return self._count
+
+	def close(self):
+		'''Unmap the file. The table then computes the public ids instead.'''
+		self._mmap.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def _find(self, s):
+		'''Return the index of the record of s in the reverse index, or None.'''
+		try:
+			key = s.encode('latin-1')
+		except UnicodeEncodeError:
+			return None
+		width = self.width
+		if len(key) > width or b'\0' in key:
+			return None
+		key = key.ljust(width, b'\0')
+		data = self._mmap
+		record_size = width + _INDEX.size
+		offset = self._reverse_offset
+		bucket = _bucket(key, self._ranks, self._base, self._prefix_length)
+		low, high = _BOUNDS.unpack_from(data, self._directory_offset + bucket * _INDEX.size)
+		end = high
+		while low < high:
+			middle = (low + high) // 2
+			position = offset + middle * record_size
+			if data[position:position + width] < key:
+				low = middle + 1
+			else:
+				high = middle
+		position = offset + low * record_size
+		if low < end and data[position:position + width] == key:
+			return _INDEX.unpack_from(data, position + width)[0]
+		return None
+
+	def obfuscate(self, num, salt=None, min_length=None):
+		if salt is None and min_length is None and num.__class__ is int:
+			index = num - self.start
+			if 0 <= index < self._count:
+				position = self._forward_offset + index * self.width
+				try:
+					return self._mmap[position:position + self.width].rstrip(b'\0').decode('latin-1')
+				except ValueError:
+					# Closed, e.g. by another thread after a config change
+					pass
+		return self.obfuscator.obfuscate(num, salt=salt, min_length=min_length)
+
+	def deobfuscate(self, s, salt=None):
+		if salt is None and self._use_reverse and s.__class__ is str:
+			try:
+				index = self._find(s)
+			except ValueError:
+				# Closed, see obfuscate
+				index = None
+			if index is not None:
+				return self.start + index
+		return self.obfuscator.deobfuscate(s, salt=salt)
+
+	def obfuscate_many(self, nums, salt=None, min_length=None, parallel=None):
+		if salt is not None or min_length is not None or parallel:
+			return self.obfuscator.obfuscate_many(nums, salt=salt, min_length=min_length, parallel=parallel)
+		return [self.obfuscate(num) for num in nums]
+
+	def deobfuscate_many(self, strings, salt=None, errors='raise', parallel=None):
+		if salt is not None or parallel or not self._use_reverse:
+			return self.obfuscator.deobfuscate_many(strings, salt=salt, errors=errors, parallel=parallel)
+		if errors not in ('raise', 'none'):
+			raise ValueError("errors must be 'raise' or 'none'")
+		out = []
+		for s in strings:
+			try:
+				out.append(self.deobfuscate(s))
+			except ValueError:
+				if errors == 'raise':
+					raise
+				out.append(None)
+		return out
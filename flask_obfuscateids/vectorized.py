@@ -0,0 +1,189 @@
+'''NumPy implementation of lib.obfuscate and lib.deobfuscate for arrays of ids.
+
+This requires numpy, install it with ``pip install flask-obfuscateids[numpy]``.
+
+Every step of the algorithm is done for all of the ids at once, one digit
+position at a time. The results are identical to calling lib.obfuscate and
+lib.deobfuscate for each id.
+'''
+import numpy as np
+
+from . import lib
+
+INT64_MAX = np.iinfo(np.int64).max
+
+
+def _alphabet_codes(alphabet):
+	'''Return the code points of the characters in alphabet as an array.'''
+	if any(len(c) != 1 for c in alphabet):
+		raise ValueError('alphabet must consist of single characters')
+	codes = np.array([ord(c) for c in alphabet], dtype=np.uint32)
+	if (codes == 0).any():
+		raise ValueError('alphabet can not contain NUL')
+	return codes
+
+
+def _max_digits(base):
+	'''Return the number of base digits that always fit in an int64.'''
+	digits = 0
+	while base ** (digits + 1) - 1 <= INT64_MAX:
+		digits += 1
+	return digits
+
+
+def _checksum(digits, base, num_check_chars):
+	'''Return the checksum value of each row of digits, see lib.calc_check_digits.'''
+	checksum = digits.sum(axis=1)
+	checksum_base = base ** num_check_chars
+	# Otherwise the sums are always smaller than checksum_base
+	if checksum_base <= INT64_MAX:
+		checksum %= checksum_base
+	return checksum
+
+
+def _obfuscate(nums, keystream, alphabet, min_chars, num_check_chars, max_length=None):
+	nums = np.asarray(nums)
+	if nums.ndim != 1 or nums.dtype.kind not in 'iu':
+		raise ValueError('nums must be a 1-d array of integers')
+	if nums.dtype.kind == 'i' and (nums < 0).any():
+		raise ValueError()
+	base = len(alphabet)
+	codes = _alphabet_codes(alphabet)
+	# Base n digits, least significant first, and the number of them per id
+	remaining = nums.astype(np.uint64)
+	columns = []
+	lengths = np.zeros(len(nums), dtype=np.intp)
+	while remaining.any() or len(columns) < min_chars:
+		lengths[(remaining > 0) | (len(columns) < min_chars)] = len(columns) + 1
+		columns.append(remaining % base)
+		remaining //= base
+	width = len(columns) + num_check_chars
+	if max_length is not None and width > max_length:
+		raise ValueError()
+	if width == 0:
+		return np.full(len(nums), '', dtype='U1')
+	digits = np.zeros((len(nums), width), dtype=np.int64)
+	for index, column in enumerate(columns):
+		digits[:, index] = column
+	# Check digits
+	if num_check_chars:
+		checksum = _checksum(digits, base, num_check_chars)
+		rows = np.arange(len(nums))
+		for index in range(num_check_chars):
+			checksum, digit = np.divmod(checksum, base)
+			digits[rows, lengths + index] = digit
+	# Encrypt
+	key_values = keystream.get(width)
+	moving_value = np.zeros(len(nums), dtype=np.int64)
+	for index in range(width):
+		encrypted = (digits[:, index] + key_values[index] + moving_value) % base
+		digits[:, index] = encrypted
+		moving_value = (moving_value + encrypted) % base
+	# Encode, NUL padding is stripped by numpy
+	chars = codes[digits]
+	chars[np.arange(width) >= (lengths + num_check_chars)[:, np.newaxis]] = 0
+	return np.ascontiguousarray(chars).view(np.dtype(('U', width))).reshape(len(nums))
+
+
+def _deobfuscate(strings, keystream, alphabet, num_check_chars, errors, max_length=None):
+	if errors not in ('raise', 'mask'):
+		raise ValueError("errors must be 'raise' or 'mask'")
+	strings = np.asarray(strings)
+	if strings.ndim != 1 or strings.dtype.kind != 'U':
+		raise ValueError('strings must be a 1-d array of strings')
+	base = len(alphabet)
+	codes = _alphabet_codes(alphabet)
+	width = strings.dtype.itemsize // 4
+	num_strings = len(strings)
+	if max_length is not None and width > max_length:
+		# Decode the strings that are short enough, the rest are invalid
+		too_long = np.char.str_len(strings) > max_length
+		strings = np.where(too_long, '', strings).astype(np.dtype(('U', max_length)))
+		width = max_length
+	else:
+		too_long = np.zeros(num_strings, dtype=bool)
+	if width == 0:
+		strings = strings.astype('U1')
+		width = 1
+	chars = np.ascontiguousarray(strings).view(np.uint32).reshape(num_strings, width)
+	present = chars != 0
+	lengths = np.where(present.any(axis=1), width - np.argmax(present[:, ::-1], axis=1), 0)
+	in_string = np.arange(width) < lengths[:, np.newaxis]
+	# Decode
+	table = np.full(int(codes.max()) + 1, -1, dtype=np.int64)
+	table[codes] = np.arange(base)
+	encrypted = np.where(chars < len(table), table[np.minimum(chars, len(table) - 1)], -1)
+	invalid = ((encrypted < 0) & in_string).any(axis=1) | too_long
+	# Decrypt
+	key_values = keystream.get(width)
+	decrypted = np.empty_like(encrypted)
+	moving_value = np.zeros(num_strings, dtype=np.int64)
+	for index in range(width):
+		decrypted[:, index] = (encrypted[:, index] - key_values[index] - moving_value) % base
+		moving_value = (moving_value + encrypted[:, index]) % base
+	# Check digits
+	num_lengths = lengths - num_check_chars
+	invalid |= num_lengths < 0
+	num_lengths = np.maximum(num_lengths, 0)
+	in_num = np.arange(width) < num_lengths[:, np.newaxis]
+	if num_check_chars:
+		checksum = _checksum(np.where(in_num, decrypted, 0), base, num_check_chars)
+		rows = np.arange(num_strings)
+		for index in range(num_check_chars):
+			checksum, digit = np.divmod(checksum, base)
+			positions = np.minimum(num_lengths + index, width - 1)
+			invalid |= decrypted[rows, positions] != digit
+	# Decode base n
+	max_digits = _max_digits(base)
+	values = np.zeros(num_strings, dtype=np.int64)
+	for index in reversed(range(min(width, max_digits))):
+		values = np.where(index < num_lengths, values * base + decrypted[:, index], values)
+	for row in np.flatnonzero((num_lengths > max_digits) & ~invalid):
+		value = lib.decode_base_n(decrypted[row, :num_lengths[row]].tolist(), base)
+		if value > INT64_MAX:
+			invalid[row] = True
+		else:
+			values[row] = value
+	if errors == 'mask':
+		return np.ma.masked_array(values, mask=invalid)
+	if invalid.any():
+		raise ValueError()
+	return values
+
+
+def obfuscate(nums, key, alphabet, min_chars=0, num_check_chars=1):
+	'''Obfuscate an array of integers using key.
+
+	Args:
+		nums: A 1-d array of integers >= 0
+		key: An int, string or bytes to generate key values
+		alphabet: A list of characters to use for the alphabet
+		min_chars: A minimum number of chars for the resulting strings
+		num_check_chars: The number of chars to use as a check
+	Returns:
+		An array of the strings lib.obfuscate returns for each of nums.
+	Raises:
+		ValueError: if nums isn't an array of integers or any are < 0
+	'''
+	keystream = lib.Keystream(key, len(alphabet))
+	return _obfuscate(nums, keystream, alphabet, min_chars, num_check_chars)
+
+
+def deobfuscate(strings, key, alphabet, num_check_chars=1, errors='raise'):
+	'''Deobfuscate an array of strings using key and alphabet.
+
+	Args:
+		strings: A 1-d array of strings
+		key: The key used to obfuscate
+		alphabet: The alphabet used to obfuscate
+		num_check_chars: The number of chars to use as a check
+		errors: What to do with invalid strings. If 'raise', raise a ValueError.
+			If 'mask', return a masked array with the invalid strings masked.
+	Returns:
+		An int64 array of the deobfuscated integers.
+	Raises:
+		ValueError: if errors is 'raise' and any of strings is invalid or
+			decodes to an integer that doesn't fit in an int64
+	'''
+	keystream = lib.Keystream(key, len(alphabet))
+	return _deobfuscate(strings, keystream, alphabet, num_check_chars, errors)
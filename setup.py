@@ -9,7 +9,8 @@ This is the description for that library
 from __future__ import unicode_literals
 from codecs import open
 import os
-from setuptools import setup, find_packages
+import platform
+from setuptools import setup, find_packages, Extension
 from setuptools.command.test import test as TestCommand
 import sys
 
@@ -35,6 +36,18 @@ here = os.path.abspath(os.path.dirname(__file__))
 with open(os.path.join(here, 'README.rst'), encoding='utf-8') as f:
 	long_description = f.read()
 
+# The C speedups are optional, lib falls back to pure Python without them
+if platform.python_implementation() == 'CPython' and sys.version_info >= (3, 3):
+	ext_modules = [
+		Extension(
+			'flask_obfuscateids._speedups',
+			sources=['flask_obfuscateids/_speedups.c'],
+			optional=True,
+			),
+		]
+else:
+	ext_modules = []
+
 
 setup(
 	name='Flask-ObfuscateIDs',
@@ -49,6 +62,7 @@ setup(
 	packages=find_packages(exclude=('tests*', 'docs', 'examples')),
 	include_package_data=True,
 	zip_safe=False,
+	ext_modules=ext_modules,
 	package_data={
 		'': ['README.md', 'LICENSE', 'AUTHORS.rst'],
 	},
@@ -56,6 +70,10 @@ setup(
 		'setuptools',
 		'Flask',
 	],
+	python_requires='>=3.7',
+	extras_require={
+		'numpy': ['numpy'],
+	},
 	tests_require=[
 		'pytest',
 	],
@@ -68,11 +86,8 @@ setup(
 		'Topic :: Software Development',
 		'License :: OSI Approved :: BSD License',
 		'Programming Language :: Python',
-		'Programming Language :: Python :: 2',
-		'Programming Language :: Python :: 2.7',
 		'Programming Language :: Python :: 3',
-		'Programming Language :: Python :: 3.3',
-		'Programming Language :: Python :: 3.4',
+		'Programming Language :: Python :: 3 :: Only',
 		'Programming Language :: Python :: Implementation :: PyPy',
 		'Environment :: Web Environment',
 		'Operating System :: OS Independent',
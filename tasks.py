@@ -18,6 +18,21 @@ def testall():
 	run('tox')
 
 
+@task
+def bench(output='benchmarks.json', compare=None):
+	"""bench - run the benchmarks and write the results as JSON."""
+	command = 'python benchmarks/bench.py --output ' + output
+	if compare:
+		command += ' --compare ' + compare
+	run(command, pty=True)
+
+
+@task(name='bench-parallel')
+def benchparallel(output='benchmarks-parallel.json'):
+	"""bench-parallel - measure the scaling of the parallel option."""
+	run('python benchmarks/parallel.py --output ' + output, pty=True)
+
+
 @task
 def clean():
 	"""clean - remove build artifacts."""
@@ -5,11 +5,48 @@ test_flask_obfuscateids
 
 Tests for `flask_obfuscateids` module.
 """
+import asyncio
+import pickle
 import random
+import subprocess
+import sys
+import threading
 
 import pytest
+from flask import Flask, has_request_context, render_template_string, request, url_for
+from werkzeug.exceptions import NotFound
 
-from flask_obfuscateids.lib import encode_base_n, decode_base_n, shuffle, key_gen, Obfuscator, ALPHANUM
+from flask_obfuscateids import (
+	ObfuscateIDs,
+	ModelMixin,
+	models,
+	public_ids,
+	public_urls,
+	metrics_recorded,
+	)
+from flask_obfuscateids import lib
+from flask_obfuscateids.extension import _current_obfuscator
+from flask_obfuscateids.metrics import Metrics, prometheus_sink
+from flask_obfuscateids.cache import CopyOnWriteLRUCache, LRUCache, ThreadLocalLRUCache, CacheInfo
+from flask_obfuscateids.lib import (
+	encode_base_n,
+	decode_base_n,
+	shuffle,
+	key_gen,
+	obfuscate,
+	deobfuscate,
+	decode,
+	decode_reverse,
+	make_reverse_table,
+	Keystream,
+	Obfuscator,
+	DeobfuscateError,
+	AlphabetError,
+	ChecksumError,
+	TooLongError,
+	ALPHANUM,
+	BASE58,
+	)
 
 
 def test_reflexivity():
@@ -50,26 +87,53 @@ def test_obfuscate_invalid_types():
 
 def test_deobfuscate_bad_checksums():
 	o = Obfuscator(0)
-	with pytest.raises(ValueError):
+	with pytest.raises(ChecksumError):
 		o.deobfuscate('gbm')
-	with pytest.raises(ValueError):
+	with pytest.raises(ChecksumError):
 		o.deobfuscate('bgM')
 
 
 def test_deobfuscate_outside_alphabet():
 	o = Obfuscator(0)
-	with pytest.raises(ValueError):
+	with pytest.raises(AlphabetError):
 		o.deobfuscate('s&M')
 
 
 def test_deobfuscate_wrong_type():
 	o = Obfuscator(0)
-	with pytest.raises(ValueError):
+	with pytest.raises(DeobfuscateError):
 		o.deobfuscate(1)
-	with pytest.raises(ValueError):
+	with pytest.raises(DeobfuscateError):
 		o.deobfuscate(0)
 
 
+@pytest.mark.parametrize('speedups', [True, False])
+def test_deobfuscate_error_reasons(speedups):
+	o = Obfuscator('key', num_check_chars=2, max_length=10, negative_cache_size=10)
+	if not speedups:
+		o._speedups = None
+	s = o.obfuscate(12345)
+	cases = [
+		(s[:-1] + ('a' if s[-1] != 'a' else 'b'), ChecksumError, 'checksum'),
+		('a', ChecksumError, 'checksum'),
+		(s[:-1] + '&', AlphabetError, 'alphabet'),
+		(s[:-1] + '\u20ac', AlphabetError, 'alphabet'),
+		('a' * 11, TooLongError, 'too_long'),
+		(None, DeobfuscateError, 'invalid'),
+		]
+	for bad, error, reason in cases:
+		# Twice to also get it from the negative cache
+		for _ in range(2):
+			with pytest.raises(error) as excinfo:
+				o.deobfuscate(bad)
+			assert excinfo.value.reason == reason
+			assert isinstance(excinfo.value, ValueError)
+	with pytest.raises(ChecksumError):
+		deobfuscate('gbm', 0, ALPHANUM)
+	with pytest.raises(AlphabetError):
+		deobfuscate('s&M', 0, ALPHANUM)
+
+
 def test_encode_base_n():
 	assert encode_base_n(5, 2) == [1, 0, 1]
 	assert encode_base_n(5, 2, 4) == [1, 0, 1, 0]
@@ -112,3 +176,932 @@ def test_preserve_state():
 	for _ in zip(range(10), key_gen('key', 10)):
 		assert random.getstate() == init_state
 	assert random.getstate() == init_state
+
+
+def test_keystream_matches_key_gen():
+	keystream = Keystream('key', 62)
+	assert list(keystream.get(3)[:3]) == [v for _, v in zip(range(3), key_gen('key', 62))]
+	assert list(keystream.get(20)[:20]) == [v for _, v in zip(range(20), key_gen('key', 62))]
+
+
+def test_keystream_cache_matches_reference():
+	o = Obfuscator('key', keystream_cache_size=2)
+	for salt in (None, 'a', 'b', 'c', 'a'):
+		key = 'key' + salt if salt else 'key'
+		for i in (0, 1, 61, 62, 10001, 2 ** 70, 10001):
+			expected = obfuscate(i, key, o.alphabet, o.min_length, o.num_check_chars)
+			assert o.obfuscate(i, salt=salt) == expected
+			assert o.deobfuscate(expected, salt=salt) == i
+	assert len(o._keystreams) == 2
+
+
+def test_keystream_max_cached():
+	keystream = Keystream('key', 62, 20)
+	expected = list(Keystream('key', 62).get(100)[:100])
+	assert list(keystream.get(100)[:100]) == expected
+	assert list(keystream.get(10)[:10]) == expected[:10]
+	assert len(keystream.get(0)) == 20
+	o = Obfuscator('key')
+	big = 62 ** 200
+	assert o.deobfuscate(o.obfuscate(big)) == big
+	with pytest.raises(AlphabetError):
+		o.deobfuscate('!' * 10000)
+	with pytest.raises(ChecksumError):
+		o.deobfuscate('a' * 10000)
+	# Long strings passed to deobfuscate don't grow the kept key values
+	assert len(o._keystream(None).get(0)) == 65
+
+
+def test_keystream_threads():
+	# Switch threads as often as possible to make them extend it at the same time
+	interval = sys.getswitchinterval()
+	sys.setswitchinterval(1e-6)
+	try:
+		for _ in range(5):
+			keystream = Keystream('key', 62)
+			expected = list(Keystream('key', 62).get(40000)[:40000])
+			errors = []
+
+			def extend(start):
+				try:
+					for length in range(start, 40000, 4999):
+						assert list(keystream.get(length)[:length]) == expected[:length]
+				except Exception as e:
+					errors.append(e)
+
+			threads = [threading.Thread(target=extend, args=(start, )) for start in range(8)]
+			for thread in threads:
+				thread.start()
+			for thread in threads:
+				thread.join()
+			assert errors == []
+	finally:
+		sys.setswitchinterval(interval)
+
+
+def test_known_values():
+	o = Obfuscator('my secret key')
+	assert [o.obfuscate(i) for i in (0, 1, 10001, 2 ** 64)] == ['u', 'Di', 'sUXU', 'lQRvKXQxMCL8']
+	assert o.obfuscate(5, salt='User') == 'M6'
+	o = Obfuscator('my secret key', alphabet=BASE58, min_length=8, num_check_chars=2)
+	assert [o.obfuscate(i) for i in (0, 1, 10001, 2 ** 64)] == [
+		'kxiWuwiq', 'yYrZK8Gm', 'wj2eFRux', 'unwhfpdBPgrZm']
+	assert o.obfuscate(5, salt='User') == 'PfFQozUA'
+
+
+def make_app(**config):
+	app = Flask(__name__)
+	app.config['SECRET_KEY'] = 'secret'
+	app.config.update(config)
+	ObfuscateIDs(app)
+	return app
+
+
+def test_obfuscator_shared_between_contexts():
+	app = make_app()
+	with app.app_context():
+		o1 = _current_obfuscator()
+	with app.test_request_context():
+		o2 = _current_obfuscator()
+	assert o1 is o2
+
+
+def test_obfuscator_rebuilt_on_config_change():
+	app = make_app()
+	state = app.extensions['obfuscateids']
+	with app.app_context():
+		o1 = _current_obfuscator()
+		public_id = ObfuscateIDs().obfuscate(1)
+		app.config['OBFUSCATE_IDS_KEY'] = 'other secret'
+		o2 = _current_obfuscator()
+		assert o1 is not o2
+		assert ObfuscateIDs().obfuscate(1) != public_id
+	assert state['obfuscator'][1] is o2
+
+
+def test_prewarm():
+	app = make_app()
+	state = app.extensions['obfuscateids']
+	o = ObfuscateIDs().prewarm(app, salts=['User'])
+	assert 'User' in o._keystreams
+	with app.app_context():
+		assert _current_obfuscator() is o
+	assert state['obfuscator'][1] is o
+
+
+def test_prewarm_defaults():
+	app = make_app(OBFUSCATE_IDS_MAX_LENGTH=20)
+	o = ObfuscateIDs(app).prewarm()
+	for salt in [None] + [model._obfuscate_ids_salt for model in models.values()]:
+		assert len(o._keystreams[salt].get(0)) == 65
+	assert FakeModel._obfuscate_ids_bound == (o, o.for_salt('FakeModel'))
+	assert o.for_salt('FakeModel')._keystream(None) is o._keystream('FakeModel')
+	o = ObfuscateIDs().prewarm(make_app(), salts=[None])
+	assert len(o._keystream(None).get(0)) == 65
+	app = make_app(OBFUSCATE_IDS_MIN_LENGTH=80, OBFUSCATE_IDS_MAX_LENGTH=100)
+	o = ObfuscateIDs().prewarm(app, salts=[None])
+	assert len(o._keystream(None).get(0)) == 100
+	# No more key values are kept than max_length
+	o = ObfuscateIDs().prewarm(make_app(OBFUSCATE_IDS_MIN_LENGTH=80), salts=[None], max_length=100)
+	assert len(o._keystream(None).get(0)) == 80
+	# Obfuscating doesn't grow the prewarmed key values
+	values = o._keystream(None).get(0)
+	o.obfuscate(2 ** 64)
+	assert o._keystream(None).get(0) is values
+
+
+def test_obfuscate_many():
+	o = Obfuscator('key')
+	nums = [0, 1, 10001, 2 ** 64, 1]
+	public_ids = o.obfuscate_many(nums, salt='User')
+	assert public_ids == [o.obfuscate(i, salt='User') for i in nums]
+	assert o.deobfuscate_many(public_ids, salt='User') == nums
+	assert o.obfuscate_many([]) == []
+	with pytest.raises(ValueError):
+		o.obfuscate_many([1, -1])
+
+
+def test_deobfuscate_many_errors():
+	o = Obfuscator('key')
+	strings = [o.obfuscate(1), 's&M', o.obfuscate(2), 1]
+	with pytest.raises(ValueError):
+		o.deobfuscate_many(strings)
+	assert o.deobfuscate_many(strings, errors='none') == [1, None, 2, None]
+	with pytest.raises(ValueError):
+		o.deobfuscate_many(strings, errors='ignore')
+
+
+def test_ext_many():
+	app = make_app()
+	with app.app_context():
+		public_ids = ObfuscateIDs().obfuscate_many([1, 2], salt='User')
+		assert public_ids == [ObfuscateIDs().obfuscate(i, salt='User') for i in (1, 2)]
+		assert ObfuscateIDs().deobfuscate_many(public_ids + ['!'], salt='User', errors='none') == [1, 2, None]
+
+
+@pytest.mark.parametrize('alphabet', [ALPHANUM, BASE58, 'αβγδεζ'])
+def test_decode_reverse(alphabet):
+	table = make_reverse_table(alphabet)
+	s = alphabet[::-1] + alphabet
+	assert decode_reverse(s, table) == decode(s, alphabet)
+	assert decode_reverse('', table) == []
+	for invalid in ('&', alphabet[0] + 'ü', alphabet[0] + '中', 1, None, b'0'):
+		with pytest.raises(ValueError):
+			decode_reverse(invalid, table)
+
+
+def test_non_latin_alphabet():
+	o = Obfuscator('key', alphabet='αβγδεζηθ')
+	for i in range(100):
+		assert o.deobfuscate(o.obfuscate(i)) == i
+	with pytest.raises(ValueError):
+		o.deobfuscate('a')
+
+
+def test_alphabet_too_short():
+	for alphabet in ('a', 'aaaa'):
+		with pytest.raises(ValueError):
+			Obfuscator('key', alphabet=alphabet)
+	assert Obfuscator('key', alphabet='aab').alphabet in ('ab', 'ba')
+
+
+@pytest.mark.parametrize('alphabet, min_length, num_check_chars', [
+	(ALPHANUM, 0, 1),
+	(ALPHANUM, 8, 0),
+	(BASE58, 4, 2),
+	('01', 3, 3),
+	])
+def test_single_pass_matches_reference(alphabet, min_length, num_check_chars):
+	rand = random.Random(0)
+	o = Obfuscator('key', alphabet=alphabet, min_length=min_length, num_check_chars=num_check_chars)
+	alphabet, min_chars = o.alphabet, o.min_length
+	nums = list(range(200)) + [rand.randrange(2 ** rand.randrange(1, 200)) for _ in range(200)]
+	for num in nums:
+		expected = obfuscate(num, 'key', alphabet, min_chars, num_check_chars)
+		assert o.obfuscate(num) == expected
+		assert o.deobfuscate(expected) == num
+	for _ in range(2000):
+		s = ''.join(rand.choice(alphabet) for _ in range(rand.randrange(6)))
+		try:
+			expected = deobfuscate(s, 'key', alphabet, num_check_chars)
+		except ValueError:
+			with pytest.raises(ValueError):
+				o.deobfuscate(s)
+		else:
+			assert o.deobfuscate(s) == expected
+
+
+def test_pickle_obfuscator():
+	o = Obfuscator('key', min_length=6, max_length=20, cache_size=10, negative_cache_size=10)
+	public_id = o.for_salt('User').obfuscate(5)
+	copy = pickle.loads(pickle.dumps(o))
+	assert copy.token is not o.token
+	assert copy._keystreams['User'].get(0) == o._keystreams['User'].get(0)
+	assert copy._salted['User']._keystreams[None] is copy._keystreams['User']
+	assert copy.for_salt('User').deobfuscate(public_id) == 5
+	assert copy.obfuscate(10001) == o.obfuscate(10001)
+	assert copy.cache_info()['obfuscate'].currsize == 1
+	assert copy._speedups is o._speedups
+
+
+def test_without_speedups(monkeypatch):
+	monkeypatch.setattr(lib, '_speedups', None)
+	o = Obfuscator('key', min_length=6)
+	assert o._speedups is None
+	public_id = o.for_salt('User').obfuscate(5)
+	assert public_id == o.obfuscate(5, salt='User')
+	copy = pickle.loads(pickle.dumps(o))
+	assert copy._speedups is None
+	assert copy.for_salt('User').deobfuscate(public_id) == 5
+
+
+def test_decode_base_n_long():
+	assert decode_base_n([1] * 100, 10) == int('1' * 100)
+
+
+def test_max_length():
+	o = Obfuscator('key', min_length=4, max_length=6)
+	assert o.deobfuscate(o.obfuscate(62 ** 5 - 1)) == 62 ** 5 - 1
+	with pytest.raises(ValueError):
+		o.obfuscate(62 ** 5)
+	with pytest.raises(TooLongError):
+		o.deobfuscate('a' * 7)
+	with pytest.raises(TooLongError):
+		o.deobfuscate('a' * 10000)
+	with pytest.raises(ValueError):
+		o.deobfuscate(1)
+	with pytest.raises(ValueError):
+		Obfuscator('key', min_length=8, max_length=6)
+	with pytest.raises(ValueError):
+		Obfuscator('key', max_length='6')
+
+
+def test_max_length_config():
+	app = make_app(OBFUSCATE_IDS_MAX_LENGTH=10)
+	with app.app_context():
+		assert _current_obfuscator().max_length == 10
+		with pytest.raises(ValueError):
+			ObfuscateIDs().deobfuscate('a' * 11)
+
+
+@pytest.mark.parametrize('alphabet, min_length, num_check_chars', [
+	(ALPHANUM, 0, 1),
+	(ALPHANUM, 70, 1),
+	(BASE58, 4, 2),
+	('01', 3, 3),
+	('01', 0, 70),
+	])
+def test_speedups_match_python(alphabet, min_length, num_check_chars):
+	speedups = pytest.importorskip('flask_obfuscateids._speedups')
+	rand = random.Random(0)
+	o = Obfuscator('key', alphabet=alphabet, min_length=min_length, num_check_chars=num_check_chars)
+	assert o._speedups is speedups
+	o_py = Obfuscator('key', alphabet=alphabet, min_length=min_length, num_check_chars=num_check_chars)
+	o_py._speedups = None
+	nums = list(range(200)) + [2 ** 64 - 1, 2 ** 64, 2 ** 100]
+	nums += [rand.randrange(2 ** rand.randrange(1, 70)) for _ in range(500)]
+	for num in nums:
+		s = o_py.obfuscate(num)
+		assert o.obfuscate(num) == s
+		assert o.deobfuscate(s) == num
+	for _ in range(2000):
+		s = ''.join(rand.choice(o.alphabet) for _ in range(rand.randrange(num_check_chars + 8)))
+		try:
+			expected = o_py.deobfuscate(s)
+		except ValueError:
+			with pytest.raises(ValueError):
+				o.deobfuscate(s)
+		else:
+			assert o.deobfuscate(s) == expected
+	for invalid in (-1, '1', 1.0, None):
+		with pytest.raises(ValueError):
+			o.obfuscate(invalid)
+	for invalid in (1, None, b'abc', 'ü', '中'):
+		with pytest.raises(ValueError):
+			o.deobfuscate(invalid)
+
+
+@pytest.mark.parametrize('cache_class', [LRUCache, CopyOnWriteLRUCache])
+def test_lru_cache(cache_class):
+	cache = cache_class(2)
+	cache.set('a', 1)
+	cache.set('b', 2)
+	assert cache.get('a') == 1
+	cache.set('c', 3)
+	assert cache.get('b') is None
+	assert cache.get('a') == 1
+	assert cache.get('c') == 3
+	assert cache.info() == CacheInfo(hits=3, misses=1, evictions=1, maxsize=2, currsize=2)
+	cache.clear()
+	assert cache.info() == CacheInfo(0, 0, 0, 2, 0)
+	with pytest.raises(ValueError):
+		cache_class(0)
+
+
+def test_copy_on_write_lru_cache_replaces_items():
+	cache = CopyOnWriteLRUCache(2)
+	cache.set('a', 1)
+	items = cache._data
+	cache.set('b', 2)
+	cache.set('a', 3)
+	assert items == {'a': [1, 0]}
+	assert cache.get('a') == 3
+	assert len(cache) == 2
+
+
+def test_obfuscator_cache():
+	o = Obfuscator('key', cache_size=10, negative_cache_size=10)
+	reference = Obfuscator('key')
+	for salt in (None, 'User'):
+		for i in range(20):
+			assert o.obfuscate(i, salt=salt) == reference.obfuscate(i, salt=salt)
+	info = o.cache_info()
+	assert info['obfuscate'] == CacheInfo(0, 40, 30, 10, 10)
+	# Obfuscating filled the deobfuscate cache
+	assert o.deobfuscate(reference.obfuscate(19, salt='User'), salt='User') == 19
+	assert o.cache_info()['deobfuscate'].hits == 1
+	assert o.obfuscate(19, salt='User') == reference.obfuscate(19, salt='User')
+	assert o.cache_info()['obfuscate'].hits == 1
+	for _ in range(2):
+		with pytest.raises(ValueError):
+			o.deobfuscate('gbm')
+	assert o.cache_info()['negative'].hits == 1
+	assert o.obfuscate(1, min_length=20) == reference.obfuscate(1, min_length=20)
+	with pytest.raises(ValueError):
+		o.obfuscate(1.0)
+	assert o.obfuscate_many([1, 2]) == reference.obfuscate_many([1, 2])
+	assert o.deobfuscate_many(['gbm', o.obfuscate(3)], errors='none') == [None, 3]
+	assert Obfuscator('key').cache_info() == {}
+
+
+def test_cache_skips_too_long():
+	o = Obfuscator('key', max_length=10, cache_size=10, negative_cache_size=10)
+	for _ in range(2):
+		with pytest.raises(TooLongError):
+			o.deobfuscate('a' * 1000)
+	# Rejected before the caches are looked at or filled
+	assert o.cache_info()['negative'] == CacheInfo(0, 0, 0, 10, 0)
+	assert o.cache_info()['deobfuscate'] == CacheInfo(0, 0, 0, 10, 0)
+
+
+def test_cache_config():
+	app = make_app(OBFUSCATE_IDS_CACHE_SIZE=100)
+	with app.app_context():
+		ObfuscateIDs().obfuscate(1)
+		ObfuscateIDs().obfuscate(1)
+		assert _current_obfuscator().cache_info()['obfuscate'].hits == 1
+
+
+class FakeColumn():
+	'''Stands in for a SQLAlchemy column, as an attribute of FakeModel.'''
+
+	def __init__(self, name):
+		self.name = name
+
+	def __get__(self, obj, cls):
+		if obj is None:
+			return self
+		return obj.__dict__[self.name]
+
+	def in_(self, values):
+		return (self.name, list(values))
+
+
+class FakeQuery():
+
+	def __init__(self, rows):
+		self.rows = rows
+		self.filters = []
+
+	def get(self, ident):
+		return self.rows.get(ident)
+
+	def filter(self, criterion):
+		name, values = criterion
+		self.filters.append(values)
+		return [self.rows[value] for value in values if value in self.rows]
+
+
+class FakeModel(ModelMixin):
+	__obfuscate_ids_salt__ = 'FakeModel'
+	id = FakeColumn('id')
+
+	def __init__(self, ident):
+		self.__dict__['id'] = ident
+
+
+def test_get_many_from_public_ids():
+	app = make_app()
+	FakeModel.query = FakeQuery(dict((i, FakeModel(i)) for i in range(10)))
+	with app.test_request_context():
+		public_ids = [FakeModel.query.get(i).public_id for i in (3, 1, 3, 5)]
+		missing_id = ObfuscateIDs().obfuscate(100, salt='FakeModel')
+		objs, missing = FakeModel.get_many_from_public_ids(
+			public_ids + ['!!', missing_id], chunk_size=2)
+		assert [obj.id for obj in objs] == [3, 1, 3, 5]
+		assert missing == ['!!', missing_id]
+		assert FakeModel.query.filters == [[3, 1], [5, 100]]
+		assert FakeModel.get_many_from_public_ids(public_ids, or_abort=404)[1] == []
+		with pytest.raises(NotFound):
+			FakeModel.get_many_from_public_ids(public_ids + ['!!'], or_abort=404)
+
+
+def test_public_id_cached():
+	app = make_app()
+	obj = FakeModel(1)
+	with app.app_context():
+		public_id = obj.public_id
+		assert public_id == ObfuscateIDs().obfuscate(1, salt='FakeModel')
+		assert obj.__dict__['_obfuscate_ids_public_id'][2] == public_id
+		obj.__dict__['id'] = 2
+		assert obj.public_id == ObfuscateIDs().obfuscate(2, salt='FakeModel')
+		app.config['OBFUSCATE_IDS_KEY'] = 'other secret'
+		assert obj.public_id == ObfuscateIDs().obfuscate(2, salt='FakeModel')
+		copy = pickle.loads(pickle.dumps(obj))
+		assert copy.public_id == obj.public_id
+	obj = FakeModel(None)
+	with app.app_context():
+		with pytest.raises(ValueError):
+			obj.public_id
+		assert '_obfuscate_ids_public_id' not in obj.__dict__
+
+
+def test_for_salt():
+	o = Obfuscator('key', cache_size=10)
+	salted = o.for_salt('User')
+	assert o.for_salt('User') is salted
+	assert o.for_salt(None) is o
+	assert salted.token is not o.token
+	assert salted._cache is not o._cache
+	for i in (0, 1, 10001, 2 ** 64):
+		assert salted.obfuscate(i) == o.obfuscate(i, salt='User')
+		assert salted.deobfuscate(o.obfuscate(i, salt='User')) == i
+	assert salted.obfuscate(1, salt='x') == o.obfuscate(1, salt='Userx')
+	o = Obfuscator('key', keystream_cache_size=2)
+	for salt in 'abc':
+		o.for_salt(salt)
+	assert list(o._salted) == ['b', 'c']
+
+
+def test_model_class_registration():
+	class DefaultSalt(ModelMixin):
+		pass
+
+	class OwnSalt(ModelMixin):
+		__obfuscate_ids_salt__ = 'OldName'
+		__obfuscate_ids_attr__ = 'pk'
+
+	assert models['DefaultSalt'] is DefaultSalt
+	assert DefaultSalt._obfuscate_ids_class_salt() == 'DefaultSalt'
+	assert DefaultSalt._obfuscate_ids_attr_name() == 'id'
+	assert OwnSalt._obfuscate_ids_class_salt() == 'OldName'
+	assert OwnSalt._obfuscate_ids_attr_name() == 'pk'
+	app = make_app()
+	with app.app_context():
+		salted = DefaultSalt._obfuscate_ids_obfuscator()
+		assert DefaultSalt._obfuscate_ids_obfuscator() is salted
+		assert salted is _current_obfuscator().for_salt('DefaultSalt')
+		assert OwnSalt._obfuscate_ids_obfuscator() is _current_obfuscator().for_salt('OldName')
+		app.config['OBFUSCATE_IDS_MIN_LENGTH'] = 10
+		assert DefaultSalt._obfuscate_ids_obfuscator() is not salted
+
+
+def test_model_name_clash():
+	class ClashingName(ModelMixin):
+		pass
+
+	other = type('ClashingName', (ModelMixin, ), {'__module__': 'other.module'})
+	assert 'ClashingName' not in models
+	app = make_app()
+
+	@app.route('/clash/<pubid(ClashingName):clash_id>')
+	def clash(clash_id):
+		return str(clash_id)
+
+	# Both classes still work and are prewarmed
+	o = ObfuscateIDs().prewarm(app)
+	assert ClashingName._obfuscate_ids_bound == other._obfuscate_ids_bound == (o, o.for_salt('ClashingName'))
+	with app.test_request_context():
+		with pytest.raises(LookupError, match='ClashingName'):
+			url_for('clash', clash_id=5)
+	renamed = type('ClashingName', (ModelMixin, ), {
+		'__module__': 'third.module',
+		'__obfuscate_ids_name__': 'OtherClashingName',
+		})
+	assert models['OtherClashingName'] is renamed
+	assert renamed._obfuscate_ids_class_salt() == 'ClashingName'
+
+
+def test_model_subclasses():
+	class Animal(ModelMixin):
+		pass
+
+	class Dog(Animal):
+		pass
+
+	class Cat(Animal):
+		__obfuscate_ids_salt__ = 'Animal'
+
+	assert models['Dog'] is Dog
+	app = make_app()
+	with app.app_context():
+		o = _current_obfuscator()
+		animal = Animal._obfuscate_ids_obfuscator()
+		assert Dog._obfuscate_ids_obfuscator() is o.for_salt('Dog')
+		assert Cat._obfuscate_ids_obfuscator() is o.for_salt('Animal')
+		# Each class keeps its own binding
+		assert Animal._obfuscate_ids_obfuscator() is animal is o.for_salt('Animal')
+		assert Dog._obfuscate_ids_bound == (o, o.for_salt('Dog'))
+		assert Animal._obfuscate_ids_bound == (o, animal)
+
+
+def test_url_converter():
+	app = make_app()
+
+	@app.route('/fake/<pubid(FakeModel):fake_id>')
+	def fake(fake_id):
+		return str(fake_id)
+
+	@app.route('/salted/<pubid(salt="abc"):abc_id>')
+	def salted(abc_id):
+		return str(abc_id)
+
+	@app.route('/plain/<pubid:some_id>')
+	def plain(some_id):
+		return str(some_id)
+
+	client = app.test_client()
+	with app.test_request_context():
+		url = url_for('fake', fake_id=5)
+		assert url == '/fake/' + FakeModel(5).public_id
+		assert url_for('fake', fake_id=FakeModel(5)) == url
+		assert url_for('salted', abc_id=5) == '/salted/' + ObfuscateIDs().obfuscate(5, salt='abc')
+		assert url_for('plain', some_id=5) == '/plain/' + ObfuscateIDs().obfuscate(5)
+		plain_url = url_for('plain', some_id=5)
+	assert client.get(url).data == b'5'
+	assert client.get(plain_url).data == b'5'
+	assert client.get('/fake/!!').status_code == 404
+	assert client.get(plain_url.replace('/plain/', '/fake/')).status_code == 404
+
+
+def test_public_ids_and_urls():
+	app = make_app()
+
+	@app.route('/fake/<public_id>')
+	def fake(public_id):
+		return public_id
+
+	@app.route('/converted/<pubid(FakeModel):fake_id>')
+	def converted(fake_id):
+		return str(fake_id)
+
+	objs = [FakeModel(i) for i in (3, 1, 2)]
+	with app.test_request_context():
+		expected = [obj.public_id for obj in objs]
+		assert public_ids(objs) == expected
+		assert public_ids(iter(objs)) == expected
+		assert public_ids([3, 1, 2], salt='FakeModel') == expected
+		assert public_ids([3, 1]) == ObfuscateIDs().obfuscate_many([3, 1])
+		assert public_ids([]) == []
+		assert public_urls(objs, 'fake') == [url_for('fake', public_id=p) for p in expected]
+		assert public_urls(objs, 'fake', _external=True, x=1) == [
+			url_for('fake', public_id=p, _external=True, x=1) for p in expected]
+		assert public_urls(objs, 'converted', arg_name='fake_id') == [
+			url_for('converted', fake_id=obj) for obj in objs]
+		assert public_urls([], 'fake') == []
+		template = '{{ objs|public_ids|join(",") }} {{ objs|public_urls("fake")|join(",") }}'
+		assert render_template_string(template, objs=objs) == '%s %s' % (
+			','.join(expected), ','.join(public_urls(objs, 'fake')))
+
+
+def test_public_urls_repeated_id():
+	app = make_app(OBFUSCATE_IDS_MIN_LENGTH=1)
+
+	@app.route('/fake/<public_id>/<other>')
+	def fake(public_id, other):
+		return public_id
+
+	objs = [FakeModel(i) for i in range(5)]
+	with app.test_request_context():
+		other = objs[0].public_id
+		assert public_urls(objs, 'fake', other=other) == [
+			url_for('fake', public_id=obj.public_id, other=other) for obj in objs]
+
+
+def test_get_obfuscator_without_context():
+	app = Flask(__name__)
+	app.config['SECRET_KEY'] = 'secret'
+	ext = ObfuscateIDs(app)
+	o = ext.get_obfuscator()
+	assert o is ObfuscateIDs().get_obfuscator(app)
+	assert ext.obfuscate(1) == o.obfuscate(1)
+	with app.app_context():
+		assert ObfuscateIDs().get_obfuscator() is o
+
+
+def test_tenants():
+	app = make_app(OBFUSCATE_IDS_TENANT_CACHE_SIZE=2)
+	ext = app.extensions['obfuscateids']['extension']
+	keys = {'a': 'key a', 'b': 'key b', 'c': 'key c'}
+	loaded = []
+
+	@ext.tenant_resolver
+	def current_tenant():
+		return app.config.get('TENANT')
+
+	@ext.tenant_key_loader
+	def tenant_key(tenant):
+		loaded.append(tenant)
+		return keys.get(tenant)
+
+	default = ext.get_obfuscator()
+	assert default.key == 'secret'
+	with app.test_request_context():
+		app.config['TENANT'] = 'a'
+		o_a = _current_obfuscator()
+		assert o_a.key == 'key a'
+		assert FakeModel(1).public_id == Obfuscator('key a', min_length=8).obfuscate(1, salt='FakeModel')
+		assert ext.get_obfuscator(tenant='b').key == 'key b'
+		assert _current_obfuscator() is o_a
+		assert loaded == ['a', 'b']
+		# c evicts b, the least recently used
+		assert ext.get_obfuscator(tenant='c').key == 'key c'
+		assert _current_obfuscator() is o_a
+		assert ext.get_obfuscator(tenant='b').key == 'key b'
+		assert loaded == ['a', 'b', 'c', 'b']
+		assert ext.tenant_cache_info() == CacheInfo(hits=3, misses=4, evictions=2, maxsize=2, currsize=2)
+		app.config['TENANT'] = 'unknown'
+		with pytest.raises(LookupError):
+			_current_obfuscator()
+		app.config['TENANT'] = None
+		assert _current_obfuscator() is default
+
+
+def test_tenant_url_converter():
+	app = make_app()
+	ext = app.extensions['obfuscateids']['extension']
+	keys = {'a': 'key a', 'b': 'key b'}
+
+	@ext.tenant_resolver
+	def current_tenant():
+		if has_request_context():
+			return request.headers.get('X-Tenant-ID')
+
+	@ext.tenant_key_loader
+	def tenant_key(tenant):
+		return keys.get(tenant)
+
+	@app.route('/fake/<pubid(FakeModel):fake_id>')
+	def fake(fake_id):
+		return str(fake_id)
+
+	client = app.test_client()
+	public_id = Obfuscator('key a', min_length=8).obfuscate(5, salt='FakeModel')
+	with app.test_request_context(headers={'X-Tenant-ID': 'a'}):
+		assert url_for('fake', fake_id=5) == '/fake/' + public_id
+	assert client.get('/fake/' + public_id, headers={'X-Tenant-ID': 'a'}).data == b'5'
+	assert client.get('/fake/' + public_id, headers={'X-Tenant-ID': 'b'}).status_code == 404
+
+
+def test_metrics():
+	app = make_app(OBFUSCATE_IDS_METRICS=True, OBFUSCATE_IDS_MAX_LENGTH=20)
+	ext = app.extensions['obfuscateids']['extension']
+	sunk = []
+	sent = []
+	ext.metrics_sink(sunk.append)
+
+	def receiver(sender, metrics):
+		sent.append((sender, metrics))
+
+	@app.route('/<pubid(FakeModel):ident>')
+	def view(ident):
+		ids = ObfuscateIDs().deobfuscate_many(['!!', 'a' * 21, 'abc'], errors='none')
+		ObfuscateIDs().obfuscate_many([1, 2, 3])
+		assert ids == [None, None, None]
+		assert ext.current_metrics().counts == {'obfuscate': 3, 'deobfuscate': 4}
+		return FakeModel(ident).public_id
+
+	with metrics_recorded.connected_to(receiver, app):
+		public_id = ext.get_obfuscator(app).obfuscate(5, salt='FakeModel')
+		client = app.test_client()
+		assert client.get('/' + public_id).data.decode() == public_id
+		assert client.get('/!!').status_code == 404
+	assert sunk == [metrics for sender, metrics in sent]
+	assert all(sender is app for sender, metrics in sent)
+	# The converter is recorded too, for the second request it fails
+	metrics, failed = sunk
+	assert metrics.counts == {'obfuscate': 4, 'deobfuscate': 4}
+	assert metrics.failures == {'alphabet': 1, 'too_long': 1, 'checksum': 1}
+	assert [len(metrics.latencies[op]) for op in ('obfuscate', 'deobfuscate')] == [2, 2]
+	assert metrics.histogram('deobfuscate')[-1] == (float('inf'), 2)
+	assert metrics.as_dict()['latency']['obfuscate']['count'] == 2
+	assert failed.counts == {'obfuscate': 0, 'deobfuscate': 1}
+	assert failed.failures == {'alphabet': 1}
+
+
+def test_metrics_bulk():
+	app = make_app(OBFUSCATE_IDS_METRICS=True)
+	ext = app.extensions['obfuscateids']['extension']
+	o = Obfuscator('secret', min_length=8)
+	strings = o.obfuscate_many(range(10), salt='User')
+	with app.app_context():
+		assert ext.obfuscate_many(range(10), salt='User', parallel=2) == strings
+		assert ext.deobfuscate_many(['!!'] + strings, salt='User', errors='none', parallel=2) == [None] + list(range(10))
+		assert list(ext.obfuscate_stream(range(10), salt='User', chunk_size=3)) == strings
+		stream = ext.deobfuscate_stream(strings[:2] + ['a' * 8], salt='User', errors='none', chunk_size=2)
+		assert list(stream) == [0, 1, None]
+		with pytest.raises(ChecksumError):
+			list(ext.deobfuscate_stream(['a' * 8], salt='User'))
+		metrics = ext.current_metrics()
+		assert metrics.counts == {'obfuscate': 20, 'deobfuscate': 14}
+		assert [len(metrics.latencies[op]) for op in ('obfuscate', 'deobfuscate')] == [2, 3]
+		assert metrics.failures == {'alphabet': 1, 'checksum': 2}
+
+
+def test_metrics_disabled():
+	app = make_app()
+	ext = app.extensions['obfuscateids']['extension']
+	with app.test_request_context():
+		assert type(_current_obfuscator()) is Obfuscator
+		FakeModel(1).public_id
+		assert ext.current_metrics() is None
+
+
+class FakeCollector():
+
+	def __init__(self):
+		self.values = {}
+
+	def labels(self, **labels):
+		collector = self
+
+		class Child():
+
+			def inc(self, amount=1):
+				key = tuple(labels.items())
+				collector.values[key] = collector.values.get(key, 0) + amount
+
+			def observe(self, value):
+				collector.values.setdefault(tuple(labels.items()), []).append(value)
+
+		return Child()
+
+
+def test_prometheus_sink():
+	calls, failures, latency = FakeCollector(), FakeCollector(), FakeCollector()
+	sink = prometheus_sink(calls, failures, latency)
+	metrics = Metrics()
+	metrics.record('obfuscate', 1e-6, 3)
+	metrics.record('deobfuscate', 2e-6)
+	metrics.record_failure('checksum')
+	sink(metrics)
+	assert calls.values == {(('operation', 'obfuscate'), ): 3, (('operation', 'deobfuscate'), ): 1}
+	assert failures.values == {(('reason', 'checksum'), ): 1}
+	assert latency.values == {(('operation', 'obfuscate'), ): [1e-6], (('operation', 'deobfuscate'), ): [2e-6]}
+
+
+class FakeAsyncSession():
+
+	def __init__(self, rows):
+		self.rows = rows
+
+	async def get(self, cls, ident):
+		return self.rows.get(ident)
+
+
+def test_aget_from_public_id():
+	app = make_app()
+	session = FakeAsyncSession({5: FakeModel(5)})
+	public_id = ObfuscateIDs(app).get_obfuscator().obfuscate(5, salt='FakeModel')
+
+	async def main():
+		obj = await FakeModel.aget_from_public_id(session, public_id, app=app)
+		assert obj.id == 5
+		assert await FakeModel.aget_from_public_id(session, '!!', app=app) is None
+		with pytest.raises(NotFound):
+			await FakeModel.aget_from_public_id(session, '!!', or_abort=404, app=app)
+
+	asyncio.run(main())
+
+
+def test_thread_local_lru_cache():
+	cache = ThreadLocalLRUCache(2)
+	cache.set('a', 1)
+	cache.set('b', 2)
+	cache.set('c', 3)
+	assert cache.get('a') is None
+	assert cache.get('c') == 3
+	seen = []
+
+	def other_thread():
+		seen.append(cache.get('c'))
+		cache.set('c', 4)
+		seen.append(cache.get('c'))
+		seen.append(cache.info())
+
+	thread = threading.Thread(target=other_thread)
+	thread.start()
+	thread.join()
+	assert seen[:2] == [None, 4]
+	assert seen[2] == CacheInfo(hits=2, misses=2, evictions=1, maxsize=2, currsize=3)
+	assert cache.get('c') == 3
+	cache.clear()
+	assert len(cache) == 0
+	assert cache.info() == CacheInfo(hits=1, misses=1, evictions=0, maxsize=2, currsize=0)
+
+
+def test_thread_local_lru_cache_dead_threads():
+	cache = ThreadLocalLRUCache(1)
+	# Keep the shards alive, like a garbage collector that frees them late would
+	shards = []
+
+	def short_lived():
+		cache.get('a')
+		cache.set('a', 1)
+		cache.set('b', 2)
+		cache.get('b')
+		shards.append(cache._local.shard)
+
+	for _ in range(100):
+		thread = threading.Thread(target=short_lived)
+		thread.start()
+		thread.join()
+	# The shards of exited threads are dropped but their counters are kept
+	assert cache.info() == CacheInfo(hits=100, misses=100, evictions=100, maxsize=1, currsize=0)
+	assert cache._totals.shards == {}
+
+
+def test_threads_stress():
+	'''Hammer one shared Obfuscator from many threads and check every result.'''
+	reference = Obfuscator('key', alphabet=BASE58, min_length=4)
+	salts = [None, 'a', 'b', 'c', 'd', 'e']
+	nums = [0, 1, 57, 58, 10001, 2 ** 40, 2 ** 64 - 1, 2 ** 64, 2 ** 200]
+	expected = dict(((num, salt), reference.obfuscate(num, salt=salt)) for num in nums for salt in salts)
+	# Small caches so they are constantly evicting and keystreams are regrown
+	o = Obfuscator(
+		'key', alphabet=BASE58, min_length=4, keystream_cache_size=3,
+		cache_size=4, negative_cache_size=2)
+	barrier = threading.Barrier(16)
+	errors = []
+
+	def hammer(seed):
+		rand = random.Random(seed)
+		barrier.wait()
+		try:
+			for _ in range(1000):
+				num = rand.choice(nums)
+				salt = rand.choice(salts)
+				s = o.obfuscate(num, salt=salt)
+				assert s == expected[num, salt]
+				assert o.deobfuscate(s, salt=salt) == num
+				with pytest.raises(ValueError):
+					o.deobfuscate('0' + s, salt=salt)
+				assert o.for_salt(salt).obfuscate(num) == s
+		except Exception as e:
+			errors.append(e)
+
+	threads = [threading.Thread(target=hammer, args=(seed,)) for seed in range(16)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert errors == []
+
+
+def test_obfuscator_compact():
+	o = Obfuscator('key')
+	assert not hasattr(o, '__dict__')
+	assert isinstance(o.alphabet, str)
+	assert sorted(o.alphabet) == sorted(ALPHANUM)
+	# Repeated characters are dropped after shuffling
+	o = Obfuscator('key', alphabet='aabbcdef')
+	assert sorted(o.alphabet) == list('abcdef')
+	for i in range(100):
+		assert o.deobfuscate(o.obfuscate(i)) == i
+	with pytest.raises(ValueError):
+		Obfuscator('key', alphabet=['ab', 'c'])
+
+
+def test_lib_imports():
+	'''Importing lib only needs the standard library.'''
+	code = (
+		'import sys\n'
+		'import flask_obfuscateids.lib\n'
+		'print(" ".join(sorted(sys.modules)))\n'
+		)
+	output = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True)
+	modules = output.split()
+	assert 'flask' not in modules
+	assert 'werkzeug' not in modules
+	assert 'collections_extended' not in modules
+	assert 'numpy' not in modules
+
+
+def test_lazy_extension_names():
+	import flask_obfuscateids
+	from flask_obfuscateids import extension
+	for name in flask_obfuscateids.EXTENSION_NAMES:
+		assert getattr(flask_obfuscateids, name) is getattr(extension, name)
+		assert name in dir(flask_obfuscateids)
+	with pytest.raises(AttributeError):
+		flask_obfuscateids.missing
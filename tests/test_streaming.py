@@ -0,0 +1,142 @@
+import io
+import json
+
+import pytest
+
+from flask_obfuscateids import lib
+from flask_obfuscateids.__main__ import main
+from flask_obfuscateids.lib import Obfuscator, chunked, ChecksumError
+from flask_obfuscateids.streaming import rewrite_rows, rewrite_csv, rewrite_jsonl
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+	if request.param == 'numpy':
+		pytest.importorskip('numpy')
+	else:
+		monkeypatch.setattr(lib, '_numpy', lambda: None)
+	monkeypatch.setattr(lib, 'MIN_VECTORIZED_CHUNK_SIZE', 2)
+	return request.param
+
+
+def test_chunked():
+	assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+	assert list(chunked([], 2)) == []
+	with pytest.raises(ValueError):
+		list(chunked([1], 0))
+
+
+def test_obfuscate_stream(backend):
+	o = Obfuscator('key', min_length=4, max_length=20)
+	nums = [0, 1, 2 ** 63 - 1, 2 ** 64 - 1, 62 ** 10, 5, 10001]
+	strings = o.obfuscate_many(nums)
+	for chunk_size in (1, 3, 100):
+		assert list(o.obfuscate_stream(iter(nums), chunk_size=chunk_size)) == strings
+		assert list(o.deobfuscate_stream(iter(strings), chunk_size=chunk_size)) == nums
+	assert list(o.obfuscate_stream(nums, salt='User')) == o.obfuscate_many(nums, salt='User')
+	assert list(o.obfuscate_stream(nums, min_length=12)) == o.obfuscate_many(nums, min_length=12)
+	stream = o.obfuscate_stream([1, 2, -1, 3], chunk_size=2)
+	assert next(stream) == strings[1]
+	next(stream)
+	with pytest.raises(ValueError):
+		next(stream)
+	with pytest.raises(ValueError):
+		list(o.obfuscate_stream([1, 2.0]))
+
+
+def test_deobfuscate_stream_errors(backend):
+	o = Obfuscator('key', max_length=14)
+	strings = o.obfuscate_many([1, 2 ** 70, 3])
+	bad = strings[0][:-1] + ('a' if strings[0][-1] != 'a' else 'b')
+	mixed = [strings[0], bad, strings[1], strings[2] + '\x00', 'a' * 15, strings[2]]
+	assert list(o.deobfuscate_stream(mixed, errors='none')) == [1, None, 2 ** 70, None, None, 3]
+	with pytest.raises(ChecksumError):
+		list(o.deobfuscate_stream(mixed))
+	assert list(o.deobfuscate_stream([strings[0], 1], errors='none')) == [1, None]
+	with pytest.raises(ValueError):
+		o.deobfuscate_stream(strings, errors='ignore')
+
+
+def test_rewrite_rows():
+	o = Obfuscator('key')
+	rows = [[1, 'a', 2], [3, 'b', ''], [4], [5, 'c', None]]
+	out = list(rewrite_rows(rows, o, {0: 'Item', 2: 'User'}, chunk_size=2))
+	assert out == [
+		[o.obfuscate(1, salt='Item'), 'a', o.obfuscate(2, salt='User')],
+		[o.obfuscate(3, salt='Item'), 'b', ''],
+		[o.obfuscate(4, salt='Item')],
+		[o.obfuscate(5, salt='Item'), 'c', None],
+		]
+	assert list(rewrite_rows(out, o, [0], salt='Item', decode=True)) == [
+		[1, 'a', o.obfuscate(2, salt='User')],
+		[3, 'b', ''],
+		[4],
+		[5, 'c', None],
+		]
+	with pytest.raises(TypeError):
+		list(rewrite_rows(rows, o, 'id'))
+
+
+def test_rewrite_csv():
+	o = Obfuscator('key', min_length=8)
+	infile = io.StringIO('id,name,owner_id\r\n1,a,5\r\n2,b,\r\n')
+	outfile = io.StringIO()
+	rewrite_csv(infile, outfile, o, {'id': 'Item', 'owner_id': 'User'}, chunk_size=1)
+	assert outfile.getvalue() == 'id,name,owner_id\r\n%s,a,%s\r\n%s,b,\r\n' % (
+		o.obfuscate(1, salt='Item'), o.obfuscate(5, salt='User'), o.obfuscate(2, salt='Item'))
+	decoded = io.StringIO()
+	rewrite_csv(io.StringIO(outfile.getvalue()), decoded, o, ['id'], salt='Item', decode=True)
+	assert decoded.getvalue().startswith('id,name,owner_id\r\n1,a,')
+	decoded = io.StringIO()
+	rewrite_csv(io.StringIO('id\r\n!!\r\n'), decoded, o, ['id'], decode=True, errors='none')
+	assert decoded.getvalue() == 'id\r\n""\r\n'
+	with pytest.raises(ValueError):
+		rewrite_csv(io.StringIO('name\r\na\r\n'), io.StringIO(), o, ['id'])
+	outfile = io.StringIO()
+	rewrite_csv(io.StringIO(''), outfile, o, ['id'])
+	assert outfile.getvalue() == ''
+
+
+def test_rewrite_jsonl():
+	o = Obfuscator('key')
+	infile = io.StringIO('{"id": 1, "name": "a"}\n\n{"id": null}\n{"name": "b"}\n')
+	outfile = io.StringIO()
+	rewrite_jsonl(infile, outfile, o, ['id'], salt='User')
+	lines = [json.loads(line) for line in outfile.getvalue().splitlines()]
+	assert lines == [{'id': o.obfuscate(1, salt='User'), 'name': 'a'}, {'id': None}, {'name': 'b'}]
+	decoded = io.StringIO()
+	rewrite_jsonl(io.StringIO(outfile.getvalue()), decoded, o, ['id'], salt='User', decode=True)
+	assert json.loads(decoded.getvalue().splitlines()[0]) == {'id': 1, 'name': 'a'}
+
+
+def test_main(tmp_path, monkeypatch, capsys):
+	monkeypatch.setenv('OBFUSCATE_IDS_KEY', 'secret')
+	o = Obfuscator('secret', min_length=8)
+	(tmp_path / 'in.jsonl').write_text('{"id": 1, "user_id": 2}\n')
+	assert main(['encode', '-c', 'id', str(tmp_path / 'in.jsonl'), str(tmp_path / 'out.jsonl'), '-c', 'user_id:User', '--salt', 'Item']) == 0
+	assert json.loads((tmp_path / 'out.jsonl').read_text()) == {
+		'id': o.obfuscate(1, salt='Item'),
+		'user_id': o.obfuscate(2, salt='User'),
+		}
+	(tmp_path / 'in.csv').write_text('id\n!!\n')
+	assert main(['decode', '--column', 'id', str(tmp_path / 'in.csv'), str(tmp_path / 'out.csv')]) == 1
+	assert 'invalid public id (alphabet)' in capsys.readouterr().err
+	monkeypatch.delenv('OBFUSCATE_IDS_KEY')
+	with pytest.raises(SystemExit):
+		main(['encode', '--column', 'id'])
+
+
+def test_parallel():
+	o = Obfuscator('key', min_length=4, cache_size=10)
+	nums = list(range(1000)) + [2 ** 70]
+	strings = o.obfuscate_many(nums, salt='User')
+	assert o.obfuscate_many(nums, salt='User', parallel=2) == strings
+	assert list(o.obfuscate_stream(nums, salt='User', chunk_size=7, parallel=2)) == strings
+	assert o.deobfuscate_many(strings, salt='User', parallel=True) == nums
+	assert o.deobfuscate_many(['!!'] + strings[:3], salt='User', errors='none', parallel=2) == [None, 0, 1, 2]
+	with pytest.raises(ChecksumError):
+		o.deobfuscate_many(strings[:3] + [strings[3] + 'a'], salt='User', parallel=2)
+	with pytest.raises(ValueError):
+		o.obfuscate_many([1, -1], parallel=2)
+	with pytest.raises(ValueError):
+		o.obfuscate_stream(nums, parallel=-1)
@@ -0,0 +1,132 @@
+import pickle
+import sys
+
+import pytest
+from flask import Flask
+
+from flask_obfuscateids import ObfuscateIDs
+from flask_obfuscateids.__main__ import main
+from flask_obfuscateids.extension import _current_obfuscator
+from flask_obfuscateids.lib import Obfuscator, ChecksumError, BASE58
+from flask_obfuscateids.table import build_table, PublicIDTable
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def build(request, monkeypatch):
+	if request.param == 'numpy':
+		pytest.importorskip('numpy')
+	else:
+		monkeypatch.setitem(sys.modules, 'numpy', None)
+	return build_table
+
+
+@pytest.mark.parametrize('alphabet, min_length', [(None, 4), (BASE58, 0)])
+def test_table(build, tmp_path, alphabet, min_length):
+	if alphabet is None:
+		o = Obfuscator('key', min_length=min_length)
+	else:
+		o = Obfuscator('key', alphabet=alphabet, min_length=min_length)
+	path = str(tmp_path / 'users.tbl')
+	build(path, o, 5, 5000, salt='User', reverse=True, chunk_size=100)
+	salted = o.for_salt('User')
+	strings = salted.obfuscate_many(range(5000))
+	with PublicIDTable(path, o, 'User') as table:
+		assert (table.start, table.stop, len(table), table.has_reverse) == (5, 5000, 4995, True)
+		assert table.obfuscate_many(range(5000)) == strings
+		assert table.obfuscate(2 ** 70) == salted.obfuscate(2 ** 70)
+		assert table.obfuscate(1, min_length=20) == salted.obfuscate(1, min_length=20)
+		# The reverse index is only used without the C speedups
+		table._use_reverse = True
+		assert table.deobfuscate_many(strings) == list(range(5000))
+		assert table.deobfuscate_many(strings[:5] + ['!!'], errors='none') == [0, 1, 2, 3, 4, None]
+		with pytest.raises(ChecksumError):
+			table.deobfuscate(strings[9] + 'a')
+		with pytest.raises(ValueError):
+			table.deobfuscate(strings[9] + '\0')
+		with pytest.raises(ValueError):
+			table.deobfuscate('\u20ac' + strings[9])
+		assert table.max_length == salted.max_length
+	with open(path, 'rb') as f:
+		data = f.read()
+	build(path, o, 5, 5000, salt='User', reverse=True)
+	with open(path, 'rb') as f:
+		assert f.read() == data
+
+
+def test_table_errors(tmp_path):
+	o = Obfuscator('key')
+	path = str(tmp_path / 'users.tbl')
+	with pytest.raises(ValueError):
+		build_table(path, o, 10, 10)
+	with pytest.raises(ValueError):
+		build_table(path, Obfuscator('key', alphabet='αβγδεζ'), 0, 10)
+	build_table(path, o, 0, 10, salt='User')
+	with PublicIDTable(path, o, 'User') as table:
+		assert not table.has_reverse
+		assert table.deobfuscate(o.obfuscate(3, salt='User')) == 3
+	with pytest.raises(ValueError):
+		PublicIDTable(path, Obfuscator('other key'), 'User')
+	with pytest.raises(ValueError):
+		PublicIDTable(path, o, 'Item')
+	(tmp_path / 'bad.tbl').write_bytes(b'not a table')
+	with pytest.raises(ValueError):
+		PublicIDTable(str(tmp_path / 'bad.tbl'), o)
+	assert sorted(p.name for p in tmp_path.iterdir()) == ['bad.tbl', 'users.tbl']
+
+
+def test_use_table(tmp_path):
+	o = Obfuscator('key')
+	path = str(tmp_path / 'users.tbl')
+	build_table(path, o, 0, 100, salt='User')
+	table = PublicIDTable(path, o, 'User')
+	with pytest.raises(ValueError):
+		Obfuscator('key').use_table(table)
+	o.use_table(table)
+	assert o.for_salt('User') is table
+	assert o.obfuscate(5, salt='User') == table.obfuscate(5)
+	copy = pickle.loads(pickle.dumps(o))
+	assert isinstance(copy.for_salt('User'), Obfuscator)
+	assert copy.for_salt('User').obfuscate(5) == table.obfuscate(5)
+	# A replaced table is closed, and still works
+	new_table = PublicIDTable(path, o, 'User')
+	o.use_table(new_table)
+	assert table._mmap.closed
+	assert table.obfuscate(5) == new_table.obfuscate(5)
+	new_table._use_reverse = True
+	o.close()
+	assert new_table._mmap.closed
+	assert new_table.deobfuscate(new_table.obfuscate(5)) == 5
+
+
+def test_use_table_kept(tmp_path):
+	o = Obfuscator('key', keystream_cache_size=2)
+	path = str(tmp_path / 'users.tbl')
+	build_table(path, o, 0, 10, salt='User')
+	table = PublicIDTable(path, o, 'User')
+	o.use_table(table)
+	for salt in 'abcd':
+		o.for_salt(salt)
+	# Salted obfuscators are evicted, tables aren't
+	assert sorted(o._salted) == ['User', 'c', 'd']
+	assert o.for_salt('User') is table
+	table.close()
+
+
+def test_tables_config(tmp_path):
+	path = str(tmp_path / 'users.tbl')
+	assert main(['build-table', path, '--salt', 'FakeUser', '--stop', '100', '--key', 'secret']) == 0
+	app = Flask(__name__)
+	app.config['SECRET_KEY'] = 'secret'
+	app.config['OBFUSCATE_IDS_TABLES'] = {'FakeUser': path}
+	ObfuscateIDs(app)
+	with app.app_context():
+		table = _current_obfuscator().for_salt('FakeUser')
+		assert isinstance(table, PublicIDTable)
+		assert (table.start, table.stop) == (1, 100)
+		o = Obfuscator('secret', min_length=8)
+		assert ObfuscateIDs().obfuscate(5, salt='FakeUser') == o.obfuscate(5, salt='FakeUser')
+		app.config['OBFUSCATE_IDS_TABLES'] = {}
+		assert isinstance(_current_obfuscator().for_salt('FakeUser'), Obfuscator)
+		# The tables of the replaced obfuscator are closed
+		assert table._mmap.closed
+	assert main(['build-table', path, '--salt', 'FakeUser', '--stop', '0', '--key', 'secret']) == 1
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+test_vectorized
+----------------------------------
+
+Tests for `flask_obfuscateids.vectorized` module.
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from flask_obfuscateids import lib, vectorized  # noqa: E402
+
+
+NUMS = [0, 1, 2, 61, 62, 63, 10001, 2 ** 31, 2 ** 62, 2 ** 63 - 1]
+
+
+@pytest.mark.parametrize('alphabet, min_chars, num_check_chars', [
+	(lib.ALPHANUM, 0, 1),
+	(lib.ALPHANUM, 7, 1),
+	(lib.BASE58, 0, 2),
+	(lib.BASE58, 12, 0),
+	('01', 3, 3),
+	])
+def test_matches_lib(alphabet, min_chars, num_check_chars):
+	strings = vectorized.obfuscate(np.array(NUMS), 'key', alphabet, min_chars, num_check_chars)
+	expected = [lib.obfuscate(i, 'key', alphabet, min_chars, num_check_chars) for i in NUMS]
+	assert strings.tolist() == expected
+	assert vectorized.deobfuscate(strings, 'key', alphabet, num_check_chars).tolist() == NUMS
+	assert vectorized.deobfuscate(expected, 'key', alphabet, num_check_chars).tolist() == NUMS
+
+
+def test_obfuscator_methods():
+	o = lib.Obfuscator('key', min_length=4)
+	strings = o.obfuscate_array(np.array(NUMS), salt='User')
+	assert strings.tolist() == o.obfuscate_many(NUMS, salt='User')
+	assert o.deobfuscate_array(strings, salt='User').tolist() == NUMS
+
+
+def test_obfuscate_invalid():
+	with pytest.raises(ValueError):
+		vectorized.obfuscate(np.array([1, -1]), 'key', lib.ALPHANUM)
+	with pytest.raises(ValueError):
+		vectorized.obfuscate(np.array([1.0]), 'key', lib.ALPHANUM)
+	with pytest.raises(ValueError):
+		vectorized.obfuscate(np.array([[1]]), 'key', lib.ALPHANUM)
+
+
+def test_deobfuscate_invalid():
+	o = lib.Obfuscator('key')
+	too_big = o.obfuscate(2 ** 64)
+	strings = np.array([o.obfuscate(1), 's&M', '', too_big, 'gbm', o.obfuscate(2)])
+	with pytest.raises(ValueError):
+		o.deobfuscate_array(strings)
+	result = o.deobfuscate_array(strings, errors='mask')
+	assert result.mask.tolist() == [
+		False, True, True, True, o.deobfuscate_many(['gbm'], errors='none') == [None], False]
+	assert result[0] == 1
+	assert result[-1] == 2
+	with pytest.raises(ValueError):
+		o.deobfuscate_array(strings, errors='none')
+
+
+def test_empty():
+	assert vectorized.obfuscate(np.array([], dtype=np.int64), 'key', lib.ALPHANUM).tolist() == []
+	assert vectorized.deobfuscate(np.array([], dtype='U1'), 'key', lib.ALPHANUM).tolist() == []
+
+
+def test_max_length():
+	o = lib.Obfuscator('key', max_length=4)
+	strings = np.array([o.obfuscate(1), 'a' * 5, o.obfuscate(62 ** 3 - 1)])
+	assert o.deobfuscate_array(strings, errors='mask').mask.tolist() == [False, True, False]
+	with pytest.raises(ValueError):
+		o.obfuscate_array(np.array([1, 62 ** 3]))